@@ -1,30 +1,73 @@
 """Check that Python and notebook files only use the allowed constructs."""
 
+from __future__ import annotations
+
 __version__ = "1.5.5"  # same as in pyproject.toml
 
 import argparse
 import ast
+import bisect
+import functools
+import hashlib
+import importlib.util
+import io
 import json
 import os
 import re
 import sys
+import threading
+import time
+from collections import deque
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from pathlib import Path
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
+
+from allowed.archive import ARCHIVE_ERRORS, SEPARATOR, is_archive, members
+from allowed.cache import MAX_SIZE, ResultCache, cache_folder
+from allowed.folders import FileFinder, changed_files
+from allowed.inference import (
+    ModuleNames,
+    NameInference,
+    index_methods,
+    merge,
+    method_type,
+    value_type,
+)
+from allowed.matrix import FORMATS as MATRIX_FORMATS
+from allowed.matrix import UsageMatrix
+from allowed.notebook import code_cells
+from allowed.profile import Profile
+from allowed.reporters import FORMATS, Reporter
+
+# The language server client and the executors are imported when needed,
+# so that checking a few Python files starts quickly.
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from concurrent.futures import Executor
 
-from allowed.ls_client import LSClient, PyreflyServer
+    from allowed.ls_client import LSClient, SessionPool
 
 issues = 0  # number of issues (unknown constructs) found
 py_checked = 0  # number of Python files checked
 nb_checked = 0  # number of notebooks checked
 unchecked = 0  # number of .py and .ipynb files skipped due to syntax or other errors
+result_cache: ResultCache | None = None  # check results of previous runs
+reporter = Reporter(sys.stdout, __version__)  # set by main() to the chosen format
+profile: Profile | None = None  # times of the checking stages, with option --profile
+matrix: UsageMatrix | None = None  # constructs used per file, with option --matrix
+file_limit: int | None = None  # violations after which a file's check stops
+max_issues: int | None = None  # violations after which the run stops
+finder = FileFinder()  # which files in folders to check
 
 PYTHON_VERSION = sys.version_info[:2]
 
-try:
-    from IPython.core.inputtransformer2 import TransformerManager as Transformer
+WATCH_INTERVAL = 0.5  # seconds between checks for changed files, with option -w
+READ_AHEAD = 64  # files sent to worker processes or threads ahead of the reports
+CELL_MEMO_SIZE = 10_000  # notebook cells whose check results are kept in memory
+# reported for a file if the type checker fails, e.g. because its server crashed
+METHODS_ERROR = "TYPE CHECKER ERROR: method calls not checked"
 
-    IPYTHON_INSTALLED = True
-except ImportError:
-    IPYTHON_INSTALLED = False
 
 # ----- Python's Abstract Syntax Tree (AST) -----
 
@@ -154,6 +197,13 @@ NO_LINE = (  # nodes without associated line numbers
     ast.comprehension,
 )
 
+# the concrete node classes of NO_LINE, for fast lookup by exact class
+NO_LINE_CLASSES = frozenset(
+    node_class
+    for abstract_class in NO_LINE
+    for node_class in (abstract_class, *abstract_class.__subclasses__())
+)
+
 # set of all built-in functions that can appear in dictionary "LANGUAGE"
 BUILTINS = {
     "abs",
@@ -244,23 +294,72 @@ LANGUAGE: dict[int, list[str]]  # unit -> list of constructs
 IMPORTS: dict[int, dict[str, list[str]]]  # unit -> module -> list of names
 METHODS: dict[int, dict[str, list[str]]]  # unit -> datatype -> list of methods
 
+# the tables are computed from the configuration by compile_units()
+UNIT_LIMITS: list[int]  # the units in the configuration, in ascending order
+UNITS: list[tuple]  # i -> allowed constructs up to UNIT_LIMITS[i-1], i.e. cumulative
+
+
+def find_configuration(filename: str) -> Path | None:
+    """Return the configuration file, or None if it doesn't exist.
+
+    Look for the file locally, then in this script's folder.
+    """
+    for file in (Path(filename), Path(__file__).parent / filename):
+        if file.exists():
+            return file
+    return None
+
+
+def read_configuration(file: Path) -> tuple[dict, dict, dict]:
+    """Return the LANGUAGE, IMPORTS and METHODS dictionaries in the file.
 
-def check_language() -> set:
-    """Return the unknown constructs in LANGUAGE."""
+    Raise ValueError, with the message to show, if the configuration is invalid.
+    """
+    try:
+        with file.open() as config_file:
+            configuration = json.load(config_file)
+        language = {}
+        for key, value in configuration["LANGUAGE"].items():
+            if not isinstance(value, list):
+                raise TypeError
+            language[int(key)] = value
+        imports = {}
+        for key, value in configuration["IMPORTS"].items():
+            if not isinstance(value, dict):
+                raise TypeError
+            imports[int(key)] = value
+        methods = {}
+        for key, value in configuration["METHODS"].items():
+            if not isinstance(value, dict):
+                raise TypeError
+            methods[int(key)] = value
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        message = "CONFIGURATION ERROR: invalid JSON format"
+        raise ValueError(message) from None
+    if unknown := check_language(language):
+        message = f"CONFIGURATION ERROR: unknown constructs:\n{', '.join(unknown)}"
+        raise ValueError(message)
+    if message := check_imports(language, imports):
+        raise ValueError(message)
+    return language, imports, methods
+
+
+def check_language(language: dict[int, list[str]]) -> set:
+    """Return the unknown constructs in the language."""
     allowed = set()
-    for constructs in LANGUAGE.values():
+    for constructs in language.values():
         allowed.update(set(constructs))
     return allowed - ABSTRACT.keys() - BUILTINS - OPTIONS
 
 
-def check_imports() -> str:
+def check_imports(language: dict[int, list[str]], imports: dict) -> str:
     """Return non-empty message if introduction of modules and import don't match."""
     statements = []
-    for unit, elements in LANGUAGE.items():
+    for unit, elements in language.items():
         if "import" in elements or "from import" in elements:
             statements.append(unit)
     first_import = min(statements) if statements else 0
-    first_module = min(IMPORTS.keys()) if IMPORTS else 0
+    first_module = min(imports.keys()) if imports else 0
 
     if first_module and not first_import:
         return (
@@ -291,6 +390,11 @@ def plural(number: int) -> str:
     return "" if number == 1 else "s"
 
 
+def log(*values: object) -> None:
+    """Print an information, warning or error message, not part of the report."""
+    print(*values, file=reporter.log)
+
+
 def show_units(filename: str, last_unit: int) -> None:
     """Print a message about the units being checked."""
     if last_unit == 1:
@@ -299,7 +403,7 @@ def show_units(filename: str, last_unit: int) -> None:
         units = f"units 1–{last_unit}"  # noqa: RUF001 (it's an en-dash)
     else:
         units = "all units"
-    print(f"INFO: checking {filename} against {units}")
+    log(f"INFO: checking {filename} against {units}")
 
 
 def get_unit(filename: str) -> int:
@@ -309,338 +413,1074 @@ def get_unit(filename: str) -> int:
     return 0
 
 
-def get_language(last_unit: int) -> tuple[type[ast.AST], ...]:
-    """Return the allowed language elements up to the given unit.
+def compile_units(
+    configured_language: dict[int, list[str]],
+    configured_imports: dict[int, dict[str, list[str]]],
+    configured_methods: dict[int, dict[str, list[str]]],
+) -> tuple[list[int], list[tuple]]:
+    """Compute the allowed constructs up to each unit of the configuration.
 
-    If `last_unit` is zero, return the elements in all units.
+    Return the units in ascending order and the constructs allowed before
+    the first unit and up to each unit, i.e. one more table than units.
+    The constructs of each unit are added to those of the previous units.
+    The tables are immutable, so they can be shared by all files checked.
     """
-    allowed = []
-    for unit, constructs in LANGUAGE.items():
-        if not last_unit or unit <= last_unit:
-            for construct in constructs:
-                if ast_class := ABSTRACT.get(construct, None):
-                    allowed.append(ast_class)  # noqa: PERF401
-    return tuple(allowed)
+    language: list[type[ast.AST]] = list(IGNORE)
+    options: set[str] = set()
+    imports: dict[str, set[str]] = {}
+    functions: set[str] = set()
+    methods: dict[str, set[str]] = {}
+    limits = sorted(
+        configured_language.keys()
+        | configured_imports.keys()
+        | configured_methods.keys()
+    )
+    tables = [freeze(language, options, imports, functions, methods)]  # before unit 1
+    for unit in limits:
+        for construct in configured_language.get(unit, []):
+            if ast_class := ABSTRACT.get(construct, None):
+                language.append(ast_class)
+            elif construct in OPTIONS:
+                options.add(construct)
+            elif construct in BUILTINS:
+                functions.add(construct)
+        for module, names in configured_imports.get(unit, {}).items():
+            imports.setdefault(module, set()).update(names)
+        for datatype, names in configured_methods.get(unit, {}).items():
+            if datatype in BUILTIN_TYPES:
+                datatype = datatype.lower()
+            methods.setdefault(datatype, set()).update(names)
+        tables.append(freeze(language, options, imports, functions, methods))
+    return limits, tables
+
+
+def freeze(
+    language: list[type[ast.AST]],
+    options: set[str],
+    imports: dict[str, set[str]],
+    functions: set[str],
+    methods: dict[str, set[str]],
+) -> tuple:
+    """Return an immutable copy of the allowed constructs and index the methods."""
+    return (
+        frozenset(language),
+        frozenset(options),
+        MappingProxyType(
+            {module: frozenset(names) for module, names in imports.items()}
+        ),
+        frozenset(functions),
+        MappingProxyType(
+            {datatype: frozenset(names) for datatype, names in methods.items()}
+        ),
+        index_methods(methods),
+    )
 
 
-def get_options(last_unit: int) -> list[str]:
-    """Return the allowed language options up to the given unit.
+def get_constructs(
+    last_unit: int, units: tuple[list[int], list[tuple]] | None = None
+) -> tuple:
+    """Return the allowed constructs up to the given unit.
 
-    If `last_unit` is zero, return the options in all units.
+    If `last_unit` is zero, return the constructs in all units.
+    The constructs are looked up in `units`, as returned by `compile_units()`,
+    or by default in the tables of the configuration being used.
     """
-    allowed = []
-    for unit, constructs in LANGUAGE.items():
-        if not last_unit or unit <= last_unit:
-            for construct in constructs:
-                if construct in OPTIONS:
-                    allowed.append(construct)  # noqa: PERF401
-    return allowed
+    limits, tables = units or (UNIT_LIMITS, UNITS)
+    if not last_unit:
+        return tables[-1]
+    return tables[bisect.bisect_right(limits, last_unit)]
 
 
-def get_imports(last_unit: int) -> dict[str, list[str]]:
-    """Return the allowed imports up to the given unit.
+class Settings(NamedTuple):
+    """How a file is checked, besides the constructs and the type checker."""
 
-    If `last_unit` is zero, return the imports in all units.
-    """
-    allowed: dict[str, list[str]] = {}
-    for unit, imports in IMPORTS.items():
-        if not last_unit or unit <= last_unit:
-            for module, names in imports.items():
-                if module in allowed:
-                    allowed[module].extend(names)
-                else:
-                    allowed[module] = names
-    return allowed
+    limit: int | None = None  # violations after which the check stops
+    profile: Profile | None = None  # to add the times of the stages to, if any
 
 
-def get_functions(last_unit: int) -> set[str]:
-    """Return the allowed functions up to the given unit.
+def timed(settings: Settings, stage: str) -> AbstractContextManager[None]:
+    """Return a context that adds its time to the stage, if profiling."""
+    times = settings.profile
+    return NOT_TIMED if times is None else times.stage(stage)
+
+
+NOT_TIMED = nullcontext()
+
+
+def location(line: int, line_cell_map: list) -> tuple[int, int]:
+    """Return (0, line) if not a notebook, otherwise (cell, relative line)."""
+    return line_cell_map[line] if line_cell_map else (0, line)
+
+
+def ignored_lines(source: list[str]) -> set[int]:
+    """Return the numbers of the lines to be ignored."""
+    return {
+        number
+        for number, line in enumerate(source, start=1)
+        if line.rstrip().endswith("# allowed")
+    }
+
+
+# ----- main functions -----
 
-    If `last_unit` is zero, return the functions in all units.
-    """
-    allowed = set()
-    for unit, constructs in LANGUAGE.items():
-        if not last_unit or unit <= last_unit:
-            for construct in constructs:
-                if construct in BUILTINS:
-                    allowed.add(construct)
-    return allowed
 
+class EnoughViolations(Exception):  # noqa: N818
+    """Raised when a file has as many violations as the limit of its check."""
 
-def get_methods(last_unit: int) -> dict[str, list[str]]:
-    """Return the allowed methods up to the given unit.
 
-    If `last_unit` is zero, return the methods in all units.
+class TreeChecker:
+    """Check an AST against the allowed constructs.
+
+    Each node is handled by the method for its class in HANDLERS (if any),
+    after checking that its class is among the allowed ones.
+    If the checker finds `limit` violations, it raises EnoughViolations.
     """
-    allowed: dict[str, list[str]] = {}
-    for unit, methods in METHODS.items():
-        if not last_unit or unit <= last_unit:
-            for datatype, names in methods.items():
-                if datatype in BUILTIN_TYPES:
-                    datatype = datatype.lower()
-                if datatype in allowed:
-                    allowed[datatype].extend(names)
+
+    def __init__(
+        self,
+        constructs: tuple,
+        source: list,
+        line_cell_map: list,
+        errors: list,
+        limit: int | None = None,
+    ) -> None:
+        """Prepare to check the source code (a list of lines) for violations."""
+        (
+            self.language,
+            self.options,
+            self.imports,
+            self.functions,
+            self.methods,
+            self.method_index,
+        ) = constructs
+        self.ignored = ignored_lines(source)
+        self.line_cell_map = line_cell_map
+        self.errors = errors
+        self.found = 0  # number of violations reported
+        self.limit = limit
+        # (line, method, method loc, receiver loc, receiver type if inferred)
+        self.calls: list[tuple] = []
+        self.receivers: dict[int, ast.Name] = {}  # call index -> receiver name
+
+    def report(self, line: int, message: str) -> None:
+        """Add a violation at the given absolute line."""
+        cell, line = location(line, self.line_cell_map)
+        self.errors.append((cell, line, message))
+        self.found += 1
+        if self.found == self.limit:
+            raise EnoughViolations
+
+    def check(self, tree: ast.AST) -> None:
+        """Check all nodes of the tree. Collect the method calls."""
+        language = self.language
+        ignored = self.ignored
+        handlers = HANDLERS
+        for node in ast.walk(tree):
+            node_class = type(node)
+            # If a node has no line number, handle it via its parent.
+            if node_class in NO_LINE_CLASSES or getattr(node, "lineno", 0) in ignored:
+                continue
+            if node_class not in language:
+                if hasattr(node, "lineno"):
+                    self.report(
+                        node.lineno, CONCRETE.get(node_class, "unknown construct")
+                    )
                 else:
-                    allowed[datatype] = names
-    return allowed
+                    # If a node has no line number, report it for inclusion in NO_LINE.
+                    message = f"unknown construct {node} at unknown line"
+                    self.errors.append((0, 0, message))
+            elif handler := handlers.get(node_class):
+                handler(self, node)
+
+    def check_operator(self, node: ast.BinOp | ast.UnaryOp | ast.BoolOp) -> None:
+        """Check the operator of a unary, binary or Boolean operation."""
+        if type(node.op) not in self.language:
+            self.report(node.lineno, CONCRETE.get(type(node.op), "unknown operator"))
+
+    def check_comparison(self, node: ast.Compare) -> None:
+        """Check the operators of a (chained) comparison."""
+        for op in node.ops:
+            if type(op) not in self.language:
+                self.report(node.lineno, CONCRETE.get(type(op), "unknown operator"))
+
+    def check_import(self, node: ast.Import) -> None:
+        """Check the imported modules."""
+        for alias in node.names:
+            if alias.name not in self.imports:
+                self.report(alias.lineno, f"{alias.name}")
+
+    def check_import_from(self, node: ast.ImportFrom) -> None:
+        """Check the module and the names imported from it."""
+        if node.module not in self.imports:
+            self.report(node.lineno, f"{node.module}")
+        else:
+            for alias in node.names:
+                if alias.name not in self.imports[node.module]:
+                    self.report(alias.lineno, f"{alias.name}")
 
+    def check_attribute(self, node: ast.Attribute) -> None:
+        """Check the attribute if it's of an imported module."""
+        if isinstance(node.value, ast.Name):
+            name = node.value
+            attribute = node.attr
+            if name.id in self.imports and attribute not in self.imports[name.id]:
+                self.report(node.lineno, f"{name.id}.{attribute}")
+
+    def check_call(self, node: ast.Call) -> None:
+        """Check the built-in function called, or collect the method called."""
+        if isinstance(node.func, ast.Attribute):
+            receiver = node.func.value
+            attribute = node.func.attr
+            lineno = receiver.lineno
+            end_col = node.func.end_col_offset
+            col = receiver.col_offset
+            if lineno is None or end_col is None or col is None:
+                method_loc = None
+                receiver_loc = None
+            else:
+                method_loc = (lineno, end_col - 1)
+                receiver_loc = (lineno, col + 1)
+            type_name = None
+            if type(receiver) is ast.Name:
+                self.receivers[len(self.calls)] = receiver
+            else:
+                type_name = method_type(value_type(receiver), attribute)
+            self.calls.append((lineno, attribute, method_loc, receiver_loc, type_name))
+        elif isinstance(node.func, ast.Name):
+            function = node.func.id
+            if function in BUILTINS and function not in self.functions:
+                self.report(node.lineno, f"{function}()")
+
+    def check_for(self, node: ast.For) -> None:
+        """Check the else-branch of the for-loop."""
+        if node.orelse and "for else" not in self.options:
+            # we assume `else:` is in the line before the first statement in that block
+            self.report(node.orelse[0].lineno - 1, "for-else")
+
+    def check_while(self, node: ast.While) -> None:
+        """Check the else-branch of the while-loop."""
+        if node.orelse and "while else" not in self.options:
+            self.report(node.orelse[0].lineno - 1, "while-else")
+
+    def infer_names(self, tree: ast.AST) -> tuple[ModuleNames, list]:
+        """Set the types of receivers that are names bound in the same function.
+
+        Return the names bound at the top level of the tree and
+        the (call index, name) pairs of the receivers at the top level,
+        whose types are set by the caller with `set_type`.
+        """
+        inference = NameInference(self.receivers)
+        module = inference.infer(tree)
+        for call, type_name in inference.types.items():
+            self.set_type(call, type_name)
+        return module, inference.top_level
+
+    def set_type(self, call: int, type_name: str | None) -> None:
+        """Set the receiver type of the call, if it defines the method called."""
+        line, method, method_loc, receiver_loc, _ = self.calls[call]
+        type_name = method_type(type_name, method)
+        self.calls[call] = (line, method, method_loc, receiver_loc, type_name)
+
+    def check_calls(self, type_checker: LSClient) -> None:
+        """Check the collected method calls.
+
+        The calls with inferred receiver types are checked first. The type
+        checker is then only asked, once per location, for the receiver types
+        that weren't inferred, of the calls that may be violations.
+        Each call is checked as soon as its receiver type is known.
+        """
+        queries: dict[tuple, list] = {}  # (method loc, receiver loc) -> calls
+        for lineno, attribute, method_loc, receiver_loc, type_name in self.calls:
+            if type_name is not None:
+                self.check_method(lineno, type_name, attribute)
+            elif (
+                method_loc is not None
+                and receiver_loc is not None
+                and self.method_index.may_violate(attribute)
+            ):
+                queries.setdefault((method_loc, receiver_loc), []).append(
+                    (lineno, attribute)
+                )
+        if queries:
+            calls = list(queries.values())
+
+            def check_query(index: int, type_name: str | None) -> None:
+                for lineno, attribute in calls[index]:
+                    self.check_method(lineno, type_name, attribute)
+
+            type_checker.receiver_types(list(queries), check_query)
+
+    def check_method(self, line: int, type_name: str | None, method: str) -> None:
+        """Check the call of the method on a receiver of the given type."""
+        if type_name is None:
+            return
+        if type_name in BUILTIN_TYPES:
+            type_name = type_name.lower()
+        if type_name in self.methods and method not in self.methods[type_name]:
+            self.report(line, f"{type_name}.{method}()")
+
+
+# the node classes that need further checks, beyond being allowed
+HANDLERS: dict[type[ast.AST], Callable[[TreeChecker, Any], None]] = {
+    ast.BinOp: TreeChecker.check_operator,
+    ast.UnaryOp: TreeChecker.check_operator,
+    ast.BoolOp: TreeChecker.check_operator,
+    ast.Compare: TreeChecker.check_comparison,
+    ast.Import: TreeChecker.check_import,
+    ast.ImportFrom: TreeChecker.check_import_from,
+    ast.Attribute: TreeChecker.check_attribute,
+    ast.Call: TreeChecker.check_call,
+    ast.For: TreeChecker.check_for,
+    ast.While: TreeChecker.check_while,
+}
 
-def get_constructs(last_unit: int) -> tuple:
-    """Return the allowed constructs up to the given unit."""
-    return (
-        IGNORE + get_language(last_unit),
-        get_options(last_unit),
-        get_imports(last_unit),
-        get_functions(last_unit),
-        get_methods(last_unit),
-    )
 
+def check_tree(  # noqa: PLR0913
+    tree: ast.AST,
+    constructs: tuple,
+    source: list,
+    line_cell_map: list,
+    errors: list,
+    type_checker: LSClient | None,
+    settings: Settings = Settings(),  # noqa: B008
+) -> None:
+    """Check if tree only uses allowed constructs. Add violations to errors.
 
-def location(line: int, line_cell_map: list) -> tuple[int, int]:
-    """Return (0, line) if not a notebook, otherwise (cell, relative line)."""
-    return line_cell_map[line] if line_cell_map else (0, line)
+    Method calls are collected during the walk and their receiver types
+    are then obtained from `type_checker` in one batch.
+    """
+    checker = TreeChecker(constructs, source, line_cell_map, errors, settings.limit)
+    try:
+        with timed(settings, "walk"):
+            checker.check(tree)
+    except EnoughViolations:
+        return
+    if checker.calls and type_checker is not None:
+        module, top_level = checker.infer_names(tree)
+        for call, name in top_level:
+            checker.set_type(call, module.type_of(name))
+        check_method_calls(checker, type_checker, settings)
+
+
+def check_method_calls(
+    checker: TreeChecker, type_checker: LSClient, settings: Settings
+) -> None:
+    """Check the method calls collected by the checker, until enough violations.
+
+    If the type checker fails, the calls not checked yet are skipped and
+    an error is added, so that the rest of the file's check is still reported.
+    """
+    with timed(settings, "hover"):
+        try:
+            checker.check_calls(type_checker)
+        except EnoughViolations:
+            pass
+        except (OSError, RuntimeError):
+            checker.errors.append((0, 0, METHODS_ERROR))
+    if settings.profile is not None:
+        settings.profile.add_latencies(type_checker.latencies)
+
+
+# ----- notebook cells -----
+
+# (id of constructs, method calls checked, violation limit, transformed cell source)
+# -> (constructs, errors, calls, top level names, top level receivers)
+# The constructs are kept so that their id isn't reused while the entry exists.
+cell_memo: dict[tuple[int, bool, int | None, str], tuple] = {}
+cell_memo_lock = threading.Lock()  # the memo is shared by the checking threads
 
+NO_NAMES = ModuleNames({}, frozenset(), dynamic=False)
 
-def ignore(node: ast.AST, source: list[str]) -> bool:
-    """Return True if node is on a line to be ignored."""
-    return hasattr(node, "lineno") and source[node.lineno - 1].rstrip().endswith(
-        "# allowed"
+
+def check_cell(
+    tree: ast.Module,
+    cell_source: str,
+    constructs: tuple,
+    methods: bool,  # noqa: FBT001
+    settings: Settings,
+) -> tuple[list, list, ModuleNames, list]:
+    """Return the violations and method calls in a cell, with the cell's lines.
+
+    The violations are (line, message) pairs and the calls are as collected
+    by `TreeChecker`. If `methods` is true, the types of receivers are
+    inferred if possible and the names and receivers at the top level
+    are returned, as by `TreeChecker.infer_names`, to be resolved for the
+    whole notebook. The result is remembered in `cell_memo`.
+    """
+    errors: list[tuple] = []
+    lines = cell_source.splitlines()
+    checker = TreeChecker(constructs, lines, [], errors, settings.limit)
+    module = NO_NAMES
+    top_level: list[tuple[int, str]] = []
+    with timed(settings, "walk"):
+        try:
+            checker.check(tree)
+        except EnoughViolations:
+            checker.calls = []  # the notebook's check stops at this cell
+        if methods and checker.calls:
+            module, top_level = checker.infer_names(tree)
+    result = (
+        [(line, message) for _, line, message in errors],
+        checker.calls,
+        module,
+        top_level,
     )
+    with cell_memo_lock:
+        if len(cell_memo) >= CELL_MEMO_SIZE:
+            cell_memo.pop(next(iter(cell_memo)), None)  # forget the oldest cell
+        key = (id(constructs), methods, settings.limit, cell_source)
+        cell_memo[key] = (constructs, *result)
+    return result
 
 
-# ----- main functions -----
+def shift_call(call: tuple, offset: int) -> tuple:
+    """Return the method call with its lines moved down by `offset`."""
+    line, method, method_loc, receiver_loc, type_name = call
+    if method_loc is not None and receiver_loc is not None:
+        method_loc = (method_loc[0] + offset, method_loc[1])
+        receiver_loc = (receiver_loc[0] + offset, receiver_loc[1])
+    return line + offset, method, method_loc, receiver_loc, type_name
 
 
-def check_tree(
-    tree: ast.AST,
+def check_cells(  # noqa: PLR0913
+    cells: list[tuple[int, int, str, Any]],
     constructs: tuple,
     source: list,
     line_cell_map: list,
     errors: list,
     type_checker: LSClient | None,
+    settings: Settings,
 ) -> None:
-    """Check if tree only uses allowed constructs. Add violations to errors."""
-    language, options, imports, functions, methods = constructs
-    for node in ast.walk(tree):
-        # If a node has no line number, handle it via its parent.
-        if isinstance(node, NO_LINE) or ignore(node, source):
-            pass
-        elif isinstance(node, (ast.BinOp, ast.UnaryOp, ast.BoolOp)):
-            if not isinstance(node.op, language):
-                cell, line = location(node.lineno, line_cell_map)
-                message = CONCRETE.get(type(node.op), "unknown operator")
-                errors.append((cell, line, message))
-        elif isinstance(node, ast.Compare):
-            for op in node.ops:
-                if not isinstance(op, language):
-                    cell, line = location(node.lineno, line_cell_map)
-                    message = CONCRETE.get(type(op), "unknown operator")
-                    errors.append((cell, line, message))
-        elif not isinstance(node, language):
-            if hasattr(node, "lineno"):
-                cell, line = location(node.lineno, line_cell_map)
-                message = CONCRETE.get(type(node), "unknown construct")
-            else:
-                # If a node has no line number, report it for inclusion in NO_LINE.
-                cell, line = 0, 0
-                message = f"unknown construct {node} at unknown line"
-            errors.append((cell, line, message))
-        elif isinstance(node, ast.Import):
-            for alias in node.names:
-                if alias.name not in imports:
-                    cell, line = location(alias.lineno, line_cell_map)
-                    message = f"{alias.name}"
-                    errors.append((cell, line, message))
-        elif isinstance(node, ast.ImportFrom):
-            if node.module not in imports:
-                cell, line = location(node.lineno, line_cell_map)
-                message = f"{node.module}"
-                errors.append((cell, line, message))
-            else:
-                for alias in node.names:
-                    if alias.name not in imports[node.module]:
-                        cell, line = location(alias.lineno, line_cell_map)
-                        message = f"{alias.name}"
-                        errors.append((cell, line, message))
-        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
-            name = node.value
-            attribute = node.attr
-            if name.id in imports:
-                if attribute not in imports[name.id]:
-                    cell, line = location(node.lineno, line_cell_map)
-                    message = f"{name.id}.{attribute}"
-                    errors.append((cell, line, message))
-        elif isinstance(node, ast.Call):
-            if isinstance(node.func, ast.Attribute) and type_checker is not None:
-                receiver = node.func.value
-                attribute = node.func.attr
-                lineno = receiver.lineno
-                end_col = node.func.end_col_offset
-                col = receiver.col_offset
-                if lineno is None or end_col is None or col is None:
-                    method_loc = None
-                    receiver_loc = None
-                else:
-                    method_loc = (lineno, end_col - 1)
-                    receiver_loc = (lineno, col + 1)
-                type_name = type_checker.receiver_type(method_loc, receiver_loc)
-                if type_name in BUILTIN_TYPES:
-                    type_name = type_name.lower()
-                if type_name in methods and attribute not in methods[type_name]:
-                    cell, line = location(lineno, line_cell_map)
-                    message = f"{type_name}.{attribute}()"
-                    errors.append((cell, line, message))
-            if isinstance(node.func, ast.Name):
-                function = node.func.id
-                if function in BUILTINS and function not in functions:
-                    cell, line = location(node.lineno, line_cell_map)
-                    message = f"{function}()"
-                    errors.append((cell, line, message))
-        elif isinstance(node, ast.For) and node.orelse and "for else" not in options:
-            # we assume `else:` is in the line before the first statement in that block
-            cell, line = location(node.orelse[0].lineno - 1, line_cell_map)
-            message = "for-else"
-            errors.append((cell, line, message))
-        elif (
-            isinstance(node, ast.While) and node.orelse and "while else" not in options
-        ):
-            cell, line = location(node.orelse[0].lineno - 1, line_cell_map)
-            message = "while-else"
-            errors.append((cell, line, message))
+    """Check the cells returned by `read_cells`. Add violations to errors.
+
+    Each cell is checked on its own, unless it was checked before against the
+    same constructs, because a cell's violations don't depend on other cells.
+    The receiver types of method calls may depend on the other cells, so
+    names bound at the top level are resolved for the whole notebook and
+    the types not inferred are obtained from `type_checker` in one batch.
+    """
+    methods = type_checker is not None
+    limit = settings.limit
+    calls: list[tuple] = []
+    # (call index, name) of the receivers at the top level
+    top_level: list[tuple[int, str]] = []
+    modules = []  # the names bound at the top level of each cell
+    found = 0  # number of violations in the cells
+    for cell_num, offset, cell_source, tree_or_result in cells:
+        if isinstance(tree_or_result, ast.Module):
+            tree_or_result = check_cell(  # noqa: PLW2901
+                tree_or_result, cell_source, constructs, methods, settings
+            )
+        cell_errors, cell_calls, module, cell_top_level = tree_or_result
+        if limit is not None:
+            cell_errors = cell_errors[: limit - found]
+        found += len(cell_errors)
+        errors.extend((cell_num, line, message) for line, message in cell_errors)
+        if found == limit:
+            return
+        top_level.extend((len(calls) + call, name) for call, name in cell_top_level)
+        calls.extend(shift_call(call, offset) for call in cell_calls)
+        modules.append(module)
+    if calls and type_checker is not None:
+        checker = TreeChecker(constructs, source, line_cell_map, errors, limit)
+        checker.calls = calls
+        checker.found = found
+        names = merge(modules)
+        for call, name in top_level:
+            checker.set_type(call, names.type_of(name))
+        check_method_calls(checker, type_checker, settings)
+
+
+def find_files(folder: str, last_unit: int) -> Iterator[tuple[str, int]]:
+    """Yield the Python files and notebooks in `folder` and subfolders, in order.
+
+    Each file is paired with the unit it is checked against:
+    `last_unit` if non-zero, otherwise the unit in the file name (if any).
+    Files and subfolders excluded by the options aren't included.
+    """
+    for fullname in finder.find(folder):
+        yield fullname, last_unit or get_unit(Path(fullname).name)
 
 
 def check_folder(
     folder: str,
     last_unit: int,
-    check_method_calls: bool,  # noqa: FBT001
     report_first: bool,  # noqa: FBT001
     verbose: bool,  # noqa: FBT001
+    executor: Executor | None = None,
 ) -> None:
     """Check all Python files in `folder` and its subfolders."""
-    global_constructs = get_constructs(last_unit)
-    for current_folder, subfolders, files in os.walk(folder):
-        subfolders.sort()
-        for filename in sorted(files):
-            if filename.endswith((".py", ".ipynb")):
-                fullname = str(Path(current_folder) / filename)
-                if not last_unit and (file_unit := get_unit(filename)):
-                    constructs = get_constructs(file_unit)
-                    if verbose:
-                        show_units(fullname, file_unit)
-                else:
-                    constructs = global_constructs
-                    if verbose:
-                        show_units(fullname, last_unit)
-                check_file(fullname, constructs, check_method_calls, report_first)
+    check_files(find_files(folder, last_unit), report_first, verbose, executor)
 
 
-def check_file(
-    filename: str,
-    constructs: tuple,
-    check_method_calls: bool,  # noqa: FBT001
+def enough_issues() -> bool:
+    """Return True if the run must stop because of option --max-issues."""
+    return max_issues is not None and issues >= max_issues
+
+
+def check_files(
+    files: Iterable[tuple[str, int]],
     report_first: bool,  # noqa: FBT001
+    verbose: bool,  # noqa: FBT001
+    executor: Executor | None = None,
 ) -> None:
-    """Check that the file only uses the allowed constructs."""
-    global py_checked, nb_checked, unchecked, issues
+    """Check and report the given (file, unit) pairs in the given order.
+
+    If an executor is given, the files are checked by its worker processes
+    or threads, otherwise they're checked one by one in this process.
+    The files are only taken from `files` as needed, and no more are
+    checked once there are enough issues.
+    """
+    pending: deque[tuple[tuple[str, int], Any]] = deque()  # (file, unit), future
+    for file in files:
+        if enough_issues():
+            break
+        if executor:
+            pending.append((file, executor.submit(check_in_worker, file)))
+            if len(pending) > READ_AHEAD:
+                done, future = pending.popleft()
+                report_result(done, future.result(), report_first, verbose)
+        else:
+            report_result(file, check_in_worker(file), report_first, verbose)
+    for done, future in pending:
+        if enough_issues():
+            future.cancel()
+        else:
+            report_result(done, future.result(), report_first, verbose)
 
+
+def check_archive(
+    archive: str,
+    last_unit: int,
+    report_first: bool,  # noqa: FBT001
+    verbose: bool,  # noqa: FBT001
+    executor: Executor | None = None,
+) -> None:
+    """Check and report the Python files and notebooks in a zip or tar archive.
+
+    Each member is reported as `archive!member` and checked against
+    `last_unit` if non-zero, otherwise against the unit in its name (if any).
+    If an executor is given, the members are read here and checked by
+    its worker processes or threads. If the archive can't be read,
+    it's reported as unchecked after the members read until then.
+    """
+    pending: deque[tuple[tuple[str, int], Any]] = deque()  # (file, unit), future
+    error = ""
     try:
-        with Path(filename).open(encoding="utf-8", errors="surrogateescape") as file:
-            if filename.endswith(".ipynb"):
-                source, line_cell_map, errors = read_notebook(file.read())
-            else:
-                source = file.read()
-                line_cell_map = []
-                errors = []
-        tree = ast.parse(source)  # raises exception on syntax errors
-        client = None
-        if check_method_calls and METHODS:
-            try:
-                client = LSClient(source, PyreflyServer())
-            except (OSError, RuntimeError) as error:
-                client = None
-                print(
-                    f"{filename}: WARNING: couldn't check method calls due to\n{error}"
+        for member, file in members(archive):
+            if enough_issues():
+                break
+            filename = f"{archive}{SEPARATOR}{member}"
+            unit = last_unit or get_unit(Path(member).name)
+            if executor:
+                future = executor.submit(
+                    check_member_in_worker, filename, unit, file.read()
                 )
-        try:
-            check_tree(
-                tree, constructs, source.splitlines(), line_cell_map, errors, client
-            )
-        finally:
-            if client is not None:
-                client.close()
-        errors.sort()
-        messages = set()  # for --first option: the unique messages (except errors)
-        last_error = None
-        for cell, line, message in errors:
-            if (cell, line, message) != last_error and message not in messages:
-                if cell:
-                    print(f"{filename}:cell_{cell}:{line}: {message}")
-                else:
-                    print(f"{filename}:{line}: {message}")
-                # don't count syntax errors as unknown constructs
-                if "ERROR" not in message:
-                    issues += 1
-                if report_first and "ERROR" not in message:
-                    messages.add(message)
-                last_error = (cell, line, message)
-        if filename.endswith(".py"):
-            py_checked += 1
+                pending.append(((filename, unit), future))
+                if len(pending) > READ_AHEAD:
+                    done, future = pending.popleft()
+                    report_result(done, future.result(), report_first, verbose)
+            else:
+                result = (*check_member(filename, unit, file), None)
+                report_result((filename, unit), result, report_first, verbose)
+    except OSError as exception:
+        error = f"OS ERROR: {exception.strerror}"
+    except ARCHIVE_ERRORS:
+        error = "FORMAT ERROR: invalid archive"
+    for done, future in pending:
+        if enough_issues():
+            future.cancel()
         else:
-            nb_checked += 1
+            report_result(done, future.result(), report_first, verbose)
+    if error:
+        report_file(archive, False, [(0, None, error)], report_first)  # noqa: FBT003
+
+
+def check_file(
+    filename: str,
+    constructs: tuple,
+    type_checker: LSClient | None,
+    settings: Settings = Settings(),  # noqa: B008
+) -> tuple[bool, list]:
+    """Check that the file only uses the allowed constructs.
+
+    If `type_checker` isn't None, use it to check method calls.
+    Stop at the violation limit of the settings and add the times of the
+    stages to their profile, if any.
+    Return a pair (checked, errors):
+    checked: False if the file couldn't be checked at all
+    errors: the sorted (cell, line, message) triples of the violations found;
+    `cell` is 0 for Python files and `line` is None if the message isn't about a line
+    """
+    try:
+        with Path(filename).open("rb") as file:
+            return check_stream(filename, file, constructs, type_checker, settings)
     except OSError as error:
-        print(f"{filename}: OS ERROR: {error.strerror}")
-        unchecked += 1
+        return False, [(0, None, f"OS ERROR: {error.strerror}")]
+
+
+def check_stream(
+    filename: str,
+    file: BinaryIO,
+    constructs: tuple,
+    type_checker: LSClient | None,
+    settings: Settings = Settings(),  # noqa: B008
+) -> tuple[bool, list]:
+    """Check the contents of the file, which has the given name, like `check_file`.
+
+    The name's extension determines if the contents are a notebook.
+    """
+    if settings.profile is not None:
+        settings.profile.start_file(filename)
+    try:
+        errors = check_contents(filename, file, constructs, type_checker, settings)
+    except OSError as error:
+        return False, [(0, None, f"OS ERROR: {error.strerror}")]
     except SyntaxError as error:
-        print(f"{filename}:{error.lineno}: SYNTAX ERROR: {error.msg}")
-        unchecked += 1
+        return False, [(0, error.lineno, f"SYNTAX ERROR: {error.msg}")]
     except UnicodeError as error:
-        print(f"{filename}: UNICODE ERROR: {error}")
-        unchecked += 1
+        return False, [(0, None, f"UNICODE ERROR: {error}")]
     except json.decoder.JSONDecodeError as error:
-        print(f"{filename}:{error.lineno}: FORMAT ERROR: invalid notebook format")
-        unchecked += 1
+        return False, [(0, error.lineno, "FORMAT ERROR: invalid notebook format")]
     except ValueError as error:
-        print(f"{filename}: VALUE ERROR: {error}")
+        return False, [(0, None, f"VALUE ERROR: {error}")]
+    return True, errors
+
+
+def check_contents(
+    filename: str,
+    file: BinaryIO,
+    constructs: tuple,
+    type_checker: LSClient | None,
+    settings: Settings,
+) -> list:
+    """Return the sorted violations in the contents of the file, like `check_stream`.
+
+    Raise the exceptions of reading and parsing the contents.
+    """
+    if filename.endswith(".ipynb"):
+        with timed(settings, "read"):
+            source, line_cell_map, errors, cells = read_cells(
+                file, constructs, type_checker is not None, settings
+            )
+    else:
+        with timed(settings, "read"):
+            text = io.TextIOWrapper(file, encoding="utf-8", errors="surrogateescape")
+            source = text.read()
+            text.detach()  # the caller closes the file
+        line_cell_map = []
+        errors = []
+        with timed(settings, "parse"):
+            tree = ast.parse(source)  # raises exception on syntax errors
+    if type_checker is not None:
+        type_checker.open_document(filename, source)
+    try:
+        if filename.endswith(".ipynb"):
+            check_cells(
+                cells,
+                constructs,
+                source.splitlines(),
+                line_cell_map,
+                errors,
+                type_checker,
+                settings,
+            )
+        else:
+            check_tree(
+                tree,
+                constructs,
+                source.splitlines(),
+                line_cell_map,
+                errors,
+                type_checker,
+                settings,
+            )
+    finally:
+        if type_checker is not None:
+            type_checker.close_document()
+    errors.sort()
+    return errors
+
+
+def cache_context(check_method_calls: bool) -> str:  # noqa: FBT001
+    """Return what, besides the file and unit, determines the outcome of a check.
+
+    That's the configuration, the -m option, the violations checked per file,
+    the Python version, this tool and, with -m, the type checker's version.
+    With -m, the types of method call receivers may also depend on the other
+    modules in the checked folders, which aren't part of the context:
+    changing them doesn't invalidate results.
+    The source code of this tool is included, in case it changes without
+    a change of version number, e.g. during development.
+    """
+    configuration = json.dumps(
+        [FILE_UNIT, LANGUAGE, IMPORTS, METHODS, check_method_calls, file_limit],
+        sort_keys=True,
+    )
+    code = hashlib.sha256()
+    for module in sorted(Path(__file__).parent.glob("*.py")):
+        code.update(module.read_bytes())
+    type_checker = ""
+    if check_method_calls:
+        from allowed.ls_client import PyreflyServer, server_version
+
+        type_checker = server_version(PyreflyServer())
+    return (
+        f"{configuration}|{PYTHON_VERSION}|{__version__}|{code.hexdigest()}"
+        f"|{type_checker}"
+    )
+
+
+def check_cached(filename: str, unit: int) -> tuple[bool, list]:
+    """Check the file against the unit, unless the result is in the cache.
+
+    A language server session is only taken if the file must be checked.
+    """
+    key = None
+    if result_cache is not None:
+        try:
+            with Path(filename).open("rb") as file:
+                key = result_cache.key(file, Path(filename).suffix, unit)
+        except OSError:
+            pass  # the check reports the error
+        else:
+            if cached := result_cache.get(key):
+                checked, errors = cached
+                return checked, [tuple(error) for error in errors]
+    settings = Settings(file_limit, profile)
+    with session() as type_checker:
+        checked, errors = check_file(
+            filename, get_constructs(unit), type_checker, settings
+        )
+    if result_cache is not None and key is not None and complete(errors):
+        result_cache.put(key, [checked, errors])
+    return checked, errors
+
+
+def check_member(filename: str, unit: int, file: BinaryIO) -> tuple[bool, list]:
+    """Check the open archive member like `check_cached` checks a file."""
+    key = None
+    if result_cache is not None:
+        file = io.BytesIO(file.read())
+        key = result_cache.key(file, Path(filename).suffix, unit)
+        if cached := result_cache.get(key):
+            checked, errors = cached
+            return checked, [tuple(error) for error in errors]
+        file.seek(0)
+    settings = Settings(file_limit, profile)
+    with session() as type_checker:
+        checked, errors = check_stream(
+            filename, file, get_constructs(unit), type_checker, settings
+        )
+    if result_cache is not None and key is not None and complete(errors):
+        result_cache.put(key, [checked, errors])
+    return checked, errors
+
+
+def complete(errors: list) -> bool:
+    """Return True unless some method calls weren't checked: the result isn't kept."""
+    return all(message != METHODS_ERROR for _, _, message in errors)
+
+
+def report_result(
+    file: tuple[str, int],
+    result: tuple,
+    report_first: bool,  # noqa: FBT001
+    verbose: bool,  # noqa: FBT001
+) -> None:
+    """Report the result of checking the (file, unit) pair.
+
+    The result is a triple (checked, errors, times), where `times` are
+    those recorded by a worker process while profiling, otherwise None.
+    """
+    filename, unit = file
+    checked, errors, times = result
+    if times is not None and profile is not None:
+        profile.merge(times)
+    if verbose:
+        show_units(filename, unit)
+    report_file(filename, checked, errors, report_first)
+
+
+def report_file(
+    filename: str,
+    checked: bool,  # noqa: FBT001
+    errors: list,
+    report_first: bool,  # noqa: FBT001
+) -> None:
+    """Print the errors found in the file and update the counters."""
+    global py_checked, nb_checked, unchecked, issues
+
+    messages = set()  # for --first option: the unique messages (except errors)
+    last_error = None
+    reported = []
+    for cell, line, message in errors:
+        if "ERROR" not in message and enough_issues():
+            continue  # don't report more than --max-issues
+        if (cell, line, message) != last_error and message not in messages:
+            reported.append((cell, line, message))
+            # don't count syntax errors as unknown constructs
+            if "ERROR" not in message:
+                issues += 1
+            if report_first and "ERROR" not in message:
+                messages.add(message)
+            last_error = (cell, line, message)
+    reporter.file(filename, reported)
+    if matrix is not None and checked:
+        matrix.add(
+            filename, (message for _, _, message in reported if "ERROR" not in message)
+        )
+    if not checked:
         unchecked += 1
+    elif filename.endswith(".py"):
+        py_checked += 1
+    else:
+        nb_checked += 1
 
 
-def read_notebook(file_contents: str) -> tuple[str, list, list]:
-    """Return a triple (source, map, errors).
+@functools.cache
+def cell_transformer() -> Callable[[str], str] | None:
+    """Return IPython's transformer of notebook cells, or None if not installed.
+
+    IPython takes a while to import, so it's only imported for the first notebook.
+    The transformer is shared by all cells: it keeps no state between them.
+    """
+    try:
+        from IPython.core.inputtransformer2 import TransformerManager
+    except ImportError:
+        return None
+    return TransformerManager().transform_cell
+
+
+def read_cells(
+    file: BinaryIO,
+    constructs: tuple | None,
+    methods: bool = False,  # noqa: FBT001, FBT002
+    settings: Settings = Settings(),  # noqa: B008
+) -> tuple[str, list, list, list[tuple[int, int, str, Any]]]:
+    """Return a quadruple (source, map, errors, cells).
 
     source: the concatenated lines of the code cells without syntax errors
     map: an array mapping absolute lines 1, 2, ... to (cell, relative line) pairs
     errors: (cell, line, message) triples indicating where syntax errors occurred
-
+    cells: a (number, offset, source, tree or result) quadruple per code cell
+    without syntax errors, where the offset is the number of lines before the
+    cell in the notebook's source and the source is transformed by IPython.
+    If the cell was checked before against `constructs`, with or without
+    method calls as given by `methods` and with the settings' violation limit,
+    the result of `check_cell` is given instead of the cell's AST, which has
+    the cell's lines. The times of the stages are added to the settings' profile.
+
+    The notebook is read incrementally and only the code cells are decoded.
     If IPython isn't installed, cells with magics trigger syntax errors.
     """
     cell_num = 0
     line_cell_map: list[tuple[int, int]] = [(0, 0)]  # line_cell_map[0] is never used
-    source_list, errors = [], []
-    notebook = json.loads(file_contents)
-    for cell in notebook["cells"]:
-        if cell["cell_type"] == "code":
-            cell_num += 1
-            cell_source = "".join(cell["source"])
-            try:
-                if IPYTHON_INSTALLED:
-                    cell_source = Transformer().transform_cell(cell_source)
-                ast.parse(cell_source)
-                source_list.append(cell_source)
-                for cell_line_num in range(1, cell_source.count("\n") + 2):
-                    line_cell_map.append((cell_num, cell_line_num))  # noqa: PERF401
-            except SyntaxError as error:
-                errors.append((cell_num, error.lineno, f"SYNTAX ERROR: {error.msg}"))
+    source_list, errors, cells = [], [], []
+    with timed(settings, "transform"):
+        transform = cell_transformer()
+    for cell_source in code_cells(file):
+        cell_num += 1
+        try:
+            if transform:
+                with timed(settings, "transform"):
+                    cell_source = transform(cell_source)  # noqa: PLW2901
+            key = (id(constructs), methods, settings.limit, cell_source)
+            with cell_memo_lock:
+                memo = cell_memo.get(key) if constructs else None
+            if memo:
+                tree_or_result: Any = memo[1:]
+            else:
+                with timed(settings, "parse"):
+                    tree_or_result = ast.parse(cell_source)
+        except SyntaxError as error:
+            errors.append((cell_num, error.lineno, f"SYNTAX ERROR: {error.msg}"))
+            continue
+        offset = len(line_cell_map) - 1
+        cells.append((cell_num, offset, cell_source, tree_or_result))
+        source_list.append(cell_source)
+        for cell_line_num in range(1, cell_source.count("\n") + 2):
+            line_cell_map.append((cell_num, cell_line_num))  # noqa: PERF401
     source_str = "\n".join(source_list)
-    return source_str, line_cell_map, errors
+    return source_str, line_cell_map, errors, cells
+
+
+# ----- parallel checking -----
+
+sessions: SessionPool | None = None  # the language server sessions of the process
+in_worker = False  # whether this is a worker process
+
+
+@contextmanager
+def session() -> Iterator[LSClient | None]:
+    """Use a free language server session, or None if method calls aren't checked.
+
+    If profiling, the starts of the session's server are recorded on release.
+    """
+    if sessions is None:
+        yield None
+        return
+    type_checker = sessions.acquire()
+    try:
+        yield type_checker
+    finally:
+        if profile is not None:
+            startups, type_checker.startups = type_checker.startups, []
+            profile.add_startups(startups)
+        sessions.release(type_checker)
+
+
+def start_worker(  # noqa: PLR0913
+    file_unit: str,
+    language: dict,
+    imports: dict,
+    methods: dict,
+    check_method_calls: bool,  # noqa: FBT001
+    cache: ResultCache | None,
+    profiling: bool,  # noqa: FBT001
+    folders: list[str],
+    limit: int | None,
+) -> None:
+    """Initialise a worker process with the configuration of the main process."""
+    global FILE_UNIT, LANGUAGE, IMPORTS, METHODS, UNIT_LIMITS, UNITS
+    global sessions, in_worker, result_cache, profile, file_limit
+
+    FILE_UNIT, LANGUAGE, IMPORTS, METHODS = file_unit, language, imports, methods
+    UNIT_LIMITS, UNITS = compile_units(language, imports, methods)
+    result_cache = cache
+    file_limit = limit
+    in_worker = True
+    if profiling:
+        profile = Profile()
+    if check_method_calls:  # each worker process has one session of its own
+        from allowed.ls_client import PyreflyServer, SessionPool
+
+        try:
+            sessions = SessionPool(PyreflyServer(), 1, folders)
+        except (OSError, RuntimeError):
+            sessions = None
+
+
+def check_in_worker(file: tuple[str, int]) -> tuple[bool, list, tuple | None]:
+    """Check the given (file, unit) pair in a worker process or thread.
+
+    Return the result and, if profiling in a worker process,
+    the times recorded since the last file.
+    """
+    filename, unit = file
+    checked, errors = check_cached(filename, unit)
+    return checked, errors, profile.take() if profile and in_worker else None
+
+
+def check_member_in_worker(
+    filename: str, unit: int, contents: bytes
+) -> tuple[bool, list, tuple | None]:
+    """Check an archive member's contents in a worker process or thread."""
+    checked, errors = check_member(filename, unit, io.BytesIO(contents))
+    return checked, errors, profile.take() if profile and in_worker else None
 
 
 # ---- main program ----
 
 
+def show_summary(
+    report_first: bool,  # noqa: FBT001
+    check_method_calls: bool,  # noqa: FBT001
+    verbose: bool,  # noqa: FBT001
+) -> None:
+    """Print the totals (if verbose) and warnings for the files checked so far."""
+    if verbose:
+        log(
+            "INFO: checked",
+            f"{py_checked} Python file{plural(py_checked)} and",
+            f"{nb_checked} notebook{plural(nb_checked)}",
+        )
+        if issues:
+            log(
+                f"INFO: the {issues} Python construct{plural(issues)}",
+                f"listed above {'are' if issues > 1 else 'is'} not allowed",
+            )
+        elif nb_checked or py_checked:
+            log("INFO: found no disallowed Python constructs")
+        if unchecked:
+            log(
+                f"INFO: didn't check {unchecked} Python",
+                f"file{plural(unchecked)} or notebook{plural(unchecked)}",
+                "due to syntax or other errors",
+            )
+    if report_first and issues:
+        log(
+            "WARNING:",
+            "other occurrences of the listed constructs may exist (don't use option -f)",  # noqa: E501
+        )
+    if (py_checked or nb_checked) and not check_method_calls:
+        log("WARNING: didn't check method calls (use option -m if possible)")
+    if nb_checked and not importlib.util.find_spec("IPython"):
+        log(
+            "WARNING: didn't check notebook cells with %-commands (IPython not installed)"  # noqa: E501
+        )
+
+
+def file_times(names: list[str], last_unit: int) -> dict[tuple[str, int], int]:
+    """Return the modification times of the files to check, by (file, unit) pair.
+
+    `names` are the files and folders given on the command line.
+    """
+    times = {}
+    for name in names:
+        if Path(name).is_dir():
+            files: Iterable[tuple[str, int]] = find_files(name, last_unit)
+        elif name.endswith((".py", ".ipynb")):
+            files = [(name, last_unit or get_unit(Path(name).name))]
+        else:
+            continue
+        for file in files:
+            try:
+                times[file] = Path(file[0]).stat().st_mtime_ns
+            except OSError:  # noqa: PERF203
+                continue
+    return times
+
+
+def watch(  # noqa: PLR0913
+    names: list[str],
+    times: dict[tuple[str, int], int],
+    last_unit: int,
+    report_first: bool,  # noqa: FBT001
+    verbose: bool,  # noqa: FBT001
+    executor: Executor | None,
+) -> None:
+    """Recheck new and modified files until the user presses Ctrl-C.
+
+    `times` are the modification times of the files when they were last checked.
+    """
+    log("INFO: watching for changes (press Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            new_times = file_times(names, last_unit)
+            changed = [
+                file for file, mtime in new_times.items() if times.get(file) != mtime
+            ]
+            times = new_times
+            if changed:
+                check_files(changed, report_first, verbose, executor)
+    except KeyboardInterrupt:
+        pass
+
+
 def main() -> None:
     """Implement the CLI."""
-    global FILE_UNIT, LANGUAGE, IMPORTS, METHODS
+    global FILE_UNIT, LANGUAGE, IMPORTS, METHODS, UNIT_LIMITS, UNITS
+    global sessions, result_cache, reporter, profile, matrix, file_limit, max_issues
+    global finder
+
+    if sys.argv[1:2] == ["serve"]:
+        # The server uses this module, so it can't be imported at the top.
+        from allowed.daemon import serve
 
+        serve(sys.argv[2:])
+        return
     argparser = argparse.ArgumentParser(
         prog="allowed",
         description="Check that the code only uses certain constructs. "
@@ -658,6 +1498,17 @@ def main() -> None:
         action="store_true",
         help="report only the first of each disallowed construct (per file)",
     )
+    argparser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="stop checking each file at its first disallowed construct",
+    )
+    argparser.add_argument(
+        "--max-issues",
+        type=int,
+        metavar="N",
+        help="stop checking files after N disallowed constructs",
+    )
     argparser.add_argument(
         "-m",
         "--methods",
@@ -676,12 +1527,84 @@ def main() -> None:
         default="",
         help="regular expression of unit number in file name (default: '')",
     )
+    argparser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="in folders, only check files matching GLOB (can be repeated)",
+    )
+    argparser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="in folders, skip files and subfolders matching GLOB (can be repeated)",
+    )
+    argparser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="in folders, skip files and subfolders ignored by .gitignore files",
+    )
+    argparser.add_argument(
+        "--changed-since",
+        metavar="REF",
+        help="in folders, only check files added or modified since git commit REF",
+    )
     argparser.add_argument(
         "-c",
         "--config",
         default="m269.json",
         help="allow the constructs given in CONFIG (default: m269.json)",
     )
+    argparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="check files in JOBS parallel processes (0: one per core; default: 1)",
+    )
+    argparser.add_argument(
+        "--servers",
+        type=int,
+        default=0,
+        help="with -m and one job, check files in parallel with up to SERVERS "
+        "type checkers (0: one per core; default: 0)",
+    )
+    argparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't use or store the results of previous checks",
+    )
+    argparser.add_argument(
+        "--cache-size",
+        type=int,
+        default=MAX_SIZE,
+        help=f"maximum size of the results cache in MB (default: {MAX_SIZE})",
+    )
+    argparser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="after checking, recheck files whenever they change",
+    )
+    argparser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="report violations as text lines, JSON lines or SARIF (default: text)",
+    )
+    argparser.add_argument(
+        "--profile",
+        action="store_true",
+        help="show how long each stage of checking took, per file and in total",
+    )
+    argparser.add_argument(
+        "--matrix",
+        metavar="FILE",
+        help="save how often each file uses each construct not allowed "
+        "in FILE, which must end in .csv or .npz",
+    )
     argparser.add_argument(
         "-v",
         "--verbose",
@@ -690,96 +1613,175 @@ def main() -> None:
     )
     argparser.add_argument("file_or_folder", nargs="+", help="file or folder to check")
     args = argparser.parse_args()
+    reporter = FORMATS[args.format](sys.stdout, __version__)
 
     if PYTHON_VERSION < (3, 10):
-        print("ERROR: can't check code (Python 3.10 or later needed)")
+        log("ERROR: can't check code (Python 3.10 or later needed)")
         sys.exit(1)
     if args.unit < 0:
-        print("ERROR: unit must be positive")
+        log("ERROR: unit must be positive")
         sys.exit(1)
-
-    try:
-        filename = args.config
-        if not filename.endswith(".json"):
-            filename += ".json"
-        # Look for configuration locally, then in this script's folder.
-        for file in (Path(filename), Path(__file__).parent / filename):
-            if file.exists():
-                with file.open() as config_file:
-                    configuration = json.load(config_file)
-                    if args.verbose:
-                        print(f"INFO: using configuration {file.resolve()}")
-                    break
-        else:
-            print(f"CONFIGURATION ERROR: {filename} not found")
-            sys.exit(1)
-        FILE_UNIT = args.file_unit
-        LANGUAGE = {}
-        for key, value in configuration["LANGUAGE"].items():
-            if not isinstance(value, list):
-                raise TypeError
-            LANGUAGE[int(key)] = value
-        IMPORTS = {}
-        for key, value in configuration["IMPORTS"].items():
-            if not isinstance(value, dict):
-                raise TypeError
-            IMPORTS[int(key)] = value
-        METHODS = {}
-        for key, value in configuration["METHODS"].items():
-            if not isinstance(value, dict):
-                raise TypeError
-            METHODS[int(key)] = value
-    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
-        print("CONFIGURATION ERROR: invalid JSON format")
+    if args.jobs < 0:
+        log("ERROR: number of jobs must be positive")
+        sys.exit(1)
+    if args.servers < 0:
+        log("ERROR: number of servers must be positive")
+        sys.exit(1)
+    if args.max_issues is not None and args.max_issues < 1:
+        log("ERROR: maximum number of issues must be positive")
         sys.exit(1)
-    if unknown := check_language():
-        print(f"CONFIGURATION ERROR: unknown constructs:\n{', '.join(unknown)}")
+    if args.matrix and not args.matrix.endswith(MATRIX_FORMATS):
+        log("ERROR: matrix file must end in .csv or .npz")
         sys.exit(1)
-    if error := check_imports():
-        print(error)
+    if args.watch and (args.fail_fast or args.max_issues is not None):
+        log("ERROR: option -w can't be used with --fail-fast or --max-issues")
         sys.exit(1)
 
-    for name in args.file_or_folder:
-        if Path(name).is_dir():
-            check_folder(name, args.unit, args.methods, args.first, args.verbose)
-        elif name.endswith((".py", ".ipynb")):
-            unit = args.unit if args.unit else get_unit(Path(name).name)
-            if args.verbose:
-                show_units(name, unit)
-            check_file(name, get_constructs(unit), args.methods, args.first)
-        else:
-            print(f"WARNING: {name} skipped: not a folder, Python file or notebook")
+    # The type checkers start in the background while the configuration is read.
+    # Their workspace is the folders checked, if any.
+    folders = [name for name in args.file_or_folder if Path(name).is_dir()]
+    type_checker_error = None
+    if args.methods:
+        from allowed.ls_client import (
+            LSClient,
+            PyreflyServer,
+            SessionPool,
+        )
 
+        try:
+            if args.jobs == 1:
+                servers = args.servers or os.cpu_count() or 1
+                sessions = SessionPool(PyreflyServer(), servers, folders)
+            else:  # each worker process starts its own, if the server is installed
+                LSClient(PyreflyServer())
+        except (OSError, RuntimeError) as error:
+            type_checker_error = error
+
+    filename = args.config
+    if not filename.endswith(".json"):
+        filename += ".json"
+    if not (file := find_configuration(filename)):
+        log(f"CONFIGURATION ERROR: {filename} not found")
+        sys.exit(1)
+    try:
+        LANGUAGE, IMPORTS, METHODS = read_configuration(file)
+    except ValueError as error:
+        log(error)
+        sys.exit(1)
     if args.verbose:
-        print(
-            "INFO: checked",
-            f"{py_checked} Python file{plural(py_checked)} and",
-            f"{nb_checked} notebook{plural(nb_checked)}",
+        log(f"INFO: using configuration {file.resolve()}")
+    FILE_UNIT = args.file_unit
+    changed = None
+    if args.changed_since:
+        try:
+            changed = {
+                folder: changed_files(folder, args.changed_since) for folder in folders
+            }
+        except ValueError as error:
+            log(f"ERROR: {error}")
+            sys.exit(1)
+    finder = FileFinder(args.include, args.exclude, args.gitignore, changed)
+    UNIT_LIMITS, UNITS = compile_units(LANGUAGE, IMPORTS, METHODS)
+    if args.profile:
+        profile = Profile()
+    if args.matrix:
+        matrix = UsageMatrix()
+    # With --max-issues, files are checked completely, so that the first
+    # issues in line order are reported, without repetitions if option -f.
+    max_issues = args.max_issues
+    file_limit = 1 if args.fail_fast else None
+
+    check_methods = args.methods and bool(METHODS)
+    if check_methods and type_checker_error is not None:
+        log(f"WARNING: couldn't check method calls due to\n{type_checker_error}")
+        check_methods = False
+    if sessions is not None and not check_methods:
+        sessions.close()
+        sessions = None
+    if not args.no_cache:
+        result_cache = ResultCache(
+            cache_folder(),
+            args.cache_size * 1024 * 1024,
+            cache_context(check_methods),
         )
-        if issues:
-            print(
-                f"INFO: the {issues} Python construct{plural(issues)}",
-                f"listed above {'are' if issues > 1 else 'is'} not allowed",
-            )
-        elif nb_checked or py_checked:
-            print("INFO: found no disallowed Python constructs")
-        if unchecked:
-            print(
-                f"INFO: didn't check {unchecked} Python",
-                f"file{plural(unchecked)} or notebook{plural(unchecked)}",
-                "due to syntax or other errors",
-            )
-    if args.first and issues:
-        print(
-            "WARNING:",
-            "other occurrences of the listed constructs may exist (don't use option -f)",  # noqa: E501
+    # Files are checked in worker processes, each with its own type checker,
+    # or, if checking method calls, in one thread per type checker.
+    executor: Executor | None = None
+    if sessions is not None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(servers)
+    elif args.jobs != 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(
+            args.jobs or None,
+            initializer=start_worker,
+            initargs=(
+                FILE_UNIT,
+                LANGUAGE,
+                IMPORTS,
+                METHODS,
+                check_methods,
+                result_cache,
+                profile is not None,
+                folders,
+                file_limit,
+            ),
         )
-    if (py_checked or nb_checked) and not args.methods:
-        print("WARNING: didn't check method calls (use option -m if possible)")
-    if nb_checked and not IPYTHON_INSTALLED:
-        print(
-            "WARNING: didn't check notebook cells with %-commands (IPython not installed)"  # noqa: E501
+    if args.watch:  # note the times before the files are checked
+        times = file_times(args.file_or_folder, args.unit)
+    try:
+        for name in args.file_or_folder:
+            if enough_issues():
+                break
+            if Path(name).is_dir():
+                check_folder(name, args.unit, args.first, args.verbose, executor)
+            elif is_archive(name):
+                check_archive(name, args.unit, args.first, args.verbose, executor)
+            elif name.endswith((".py", ".ipynb")):
+                unit = args.unit if args.unit else get_unit(Path(name).name)
+                check_files([(name, unit)], args.first, args.verbose, executor)
+            else:
+                log(
+                    f"WARNING: {name} skipped:",
+                    "not a folder, archive, Python file or notebook",
+                )
+        show_summary(args.first, args.methods, args.verbose)
+        if args.watch:
+            watch(
+                args.file_or_folder,
+                times,
+                args.unit,
+                args.first,
+                args.verbose,
+                executor,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if sessions is not None:
+            sessions.close()
+            if profile is not None:
+                profile.add_startups(sessions.take_startups())
+        if profile is not None:
+            profile.show(reporter.log)
+        if matrix is not None:
+            try:
+                matrix.save(args.matrix)
+            except OSError as error:
+                log(f"OS ERROR: couldn't save {args.matrix}: {error.strerror}")
+        reporter.close(
+            {
+                "python_files": py_checked,
+                "notebooks": nb_checked,
+                "unchecked": unchecked,
+                "issues": issues,
+            }
         )
+    # Submission gates can use the exit status instead of the report.
+    if args.fail_fast or max_issues is not None:
+        sys.exit(1 if issues else 2 if unchecked else 0)
 
 
 if __name__ == "__main__":
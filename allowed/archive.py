@@ -0,0 +1,54 @@
+"""Read the Python files and notebooks inside zip and tar archives.
+
+The members are read straight from the archive, without extracting them,
+in the order they are stored. Tar archives are read as a stream, so that
+compressed archives are decompressed only once.
+"""
+
+import tarfile
+import zipfile
+import zlib
+from collections.abc import Iterator
+from pathlib import PurePosixPath
+from typing import BinaryIO, cast
+
+ARCHIVES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+SEPARATOR = "!"  # between the archive's name and the member's name
+IGNORED = "__MACOSX"  # folder of file metadata added by macOS to zip files
+
+# exceptions raised when the archive or one of its members is corrupted
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error)
+
+
+def is_archive(filename: str) -> bool:
+    """Return True if the file name has the extension of a supported archive."""
+    return filename.lower().endswith(ARCHIVES)
+
+
+def is_checked(member: str) -> bool:
+    """Return True if the member is a Python file or notebook to check."""
+    path = PurePosixPath(member)
+    return path.suffix in (".py", ".ipynb") and IGNORED not in path.parts
+
+
+def members(filename: str) -> Iterator[tuple[str, BinaryIO]]:
+    """Yield the name and open contents of each Python file and notebook.
+
+    Each member must be read before the next one is yielded.
+    Raise OSError if the archive can't be read and one of ARCHIVE_ERRORS
+    if it's corrupted.
+    """
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(filename) as zip_archive:
+            for zip_info in zip_archive.infolist():
+                if not zip_info.is_dir() and is_checked(zip_info.filename):
+                    with zip_archive.open(zip_info) as zip_member:
+                        yield zip_info.filename, cast(BinaryIO, zip_member)
+    else:
+        with tarfile.open(filename, "r|*") as tar_archive:
+            for tar_info in tar_archive:
+                if tar_info.isfile() and is_checked(tar_info.name):
+                    tar_member = tar_archive.extractfile(tar_info)
+                    if tar_member is not None:
+                        with tar_member:
+                            yield tar_info.name, cast(BinaryIO, tar_member)
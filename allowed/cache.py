@@ -0,0 +1,108 @@
+"""Persistent cache of check results, indexed by the hash of what determines them."""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO
+
+MAX_SIZE = 100  # default maximum size of the cache, in megabytes
+CHUNK_SIZE = 1 << 16  # bytes read at a time from the files to check
+
+
+def cache_folder() -> Path:
+    """Return the user's cache folder for this tool."""
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "allowed"
+
+
+class ResultCache:
+    """A folder of JSON files, one per result, evicted least recently used first.
+
+    Each result is stored under a key that hashes the checked file's contents and
+    kind (extension) with the context of the check (configuration, unit, options,
+    versions).
+    Reading a result marks it as recently used.
+    All file system errors are ignored: the cache then behaves as if empty.
+    """
+
+    def __init__(self, folder: Path, max_size: int, context: str) -> None:
+        """Use the folder, of at most `max_size` bytes, for checks in `context`."""
+        self._folder = folder
+        self._max_size = max_size
+        self._context = context.encode()
+        self._size: int | None = None  # computed on the first write
+
+    def key(self, file: BinaryIO, kind: str, unit: int) -> str:
+        """Return the key for the results of checking `file` against `unit`.
+
+        The kind is the file's extension, e.g. `.py`, because the same contents
+        are checked differently in a Python file and in a notebook.
+        The file is read in chunks, so that large notebooks aren't kept in memory.
+        """
+        digest = hashlib.sha256(self._context)
+        digest.update(f"\0{kind}\0{unit}\0".encode())
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        """Return the file for the given key."""
+        return self._folder / key[:2] / f"{key[2:]}.json"
+
+    def get(self, key: str) -> Any:
+        """Return the value stored under `key`, or None if there's none."""
+        path = self._path(key)
+        try:
+            with path.open(encoding="utf-8") as file:
+                value = json.load(file)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store the JSON-serialisable value under `key` and evict old values."""
+        path = self._path(key)
+        data = json.dumps(value, separators=(",", ":")).encode()
+        temporary = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary.write_bytes(data)
+            temporary.replace(path)  # atomic, in case of concurrent writers
+        except OSError:
+            return
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self._max_size:
+            self._evict()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        """Return the (last use, size, path) triples of the stored values."""
+        entries = []
+        try:
+            for subfolder in os.scandir(self._folder):
+                if subfolder.is_dir():
+                    for entry in os.scandir(subfolder.path):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        except OSError:
+            pass
+        return entries
+
+    def _evict(self) -> None:
+        """Remove the least recently used values until the size is 90% of the cap."""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        target = self._max_size * 9 // 10
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
@@ -0,0 +1,143 @@
+"""Check code from other Python programs, without printing or global state.
+
+For example, to check a submission against units 1 to 5:
+```
+from allowed.checker import Checker
+
+checker = Checker("m269", unit=5)
+for violation in checker.check_path("submission.py"):
+    print(violation.line, violation.message)
+```
+A checker can be used by several threads at once.
+"""
+
+from __future__ import annotations
+
+import io
+import threading
+from typing import TYPE_CHECKING, NamedTuple
+
+from allowed.allowed import (
+    check_file,
+    check_stream,
+    compile_units,
+    find_configuration,
+    get_constructs,
+    read_configuration,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    from allowed.ls_client import LSClient
+
+
+class Violation(NamedTuple):
+    """A construct that isn't allowed, or why the code couldn't be checked.
+
+    The cell is 0 for Python files. The line is None if the message isn't
+    about a line. If the message contains 'ERROR', the file or cell wasn't checked.
+    """
+
+    cell: int
+    line: int | None
+    message: str
+
+
+class Checker:
+    """Check code against the constructs of a configuration up to a unit."""
+
+    def __init__(
+        self,
+        config: str | Path = "m269.json",
+        *,
+        unit: int = 0,
+        methods: bool = False,
+    ) -> None:
+        """Read the configuration, given by file name or path as for option `-c`.
+
+        Check against units 1 to `unit`, or all units if `unit` is zero.
+        If `methods` is true, also check method calls, as for option `-m`.
+        Raise ValueError if the configuration doesn't exist or is invalid.
+        """
+        if unit < 0:
+            message = "ERROR: unit must be positive"
+            raise ValueError(message)
+        filename = str(config)
+        if not filename.endswith(".json"):
+            filename += ".json"
+        if not (file := find_configuration(filename)):
+            message = f"CONFIGURATION ERROR: {filename} not found"
+            raise ValueError(message)
+        language, imports, configured_methods = read_configuration(file)
+        self._constructs = get_constructs(
+            unit, compile_units(language, imports, configured_methods)
+        )
+        self._methods = methods and bool(configured_methods)
+        # The language server is started on first use and handles one file at a time.
+        self._type_checker: LSClient | None = None
+        self._lock = threading.Lock()
+        self.warning = ""  # why method calls couldn't be checked, if so
+
+    def check_source(self, text: str, name: str = "source.py") -> Iterator[Violation]:
+        """Yield the violations in the Python code, in order."""
+        yield from self._check(
+            name, io.BytesIO(text.encode("utf-8", "surrogateescape"))
+        )
+
+    def check_notebook(
+        self, data: str | bytes, name: str = "notebook.ipynb"
+    ) -> Iterator[Violation]:
+        """Yield the violations in the notebook's JSON text, in order."""
+        if isinstance(data, str):
+            data = data.encode("utf-8", "surrogateescape")
+        yield from self._check(name, io.BytesIO(data))
+
+    def check_path(self, path: str | Path) -> Iterator[Violation]:
+        """Yield the violations in the `.py` or `.ipynb` file, in order."""
+        yield from self._check(str(path), None)
+
+    def _check(self, filename: str, file: io.BytesIO | None) -> Iterator[Violation]:
+        """Check the file or, if `file` isn't None, its contents."""
+        if self._methods:
+            with self._lock:
+                errors = self._errors(filename, file, self._start_type_checker())
+        else:
+            errors = self._errors(filename, file, None)
+        for cell, line, message in errors:
+            yield Violation(cell, line, message)
+
+    def _errors(
+        self, filename: str, file: io.BytesIO | None, type_checker: LSClient | None
+    ) -> list:
+        """Return the sorted (cell, line, message) triples for the file."""
+        if file is None:
+            return check_file(filename, self._constructs, type_checker)[1]
+        return check_stream(filename, file, self._constructs, type_checker)[1]
+
+    def _start_type_checker(self) -> LSClient | None:
+        """Return the language server, starting it if needed. Hold the lock."""
+        if self._type_checker is None and not self.warning:
+            from allowed.ls_client import LSClient, PyreflyServer
+
+            try:
+                self._type_checker = LSClient(PyreflyServer())
+            except (OSError, RuntimeError) as error:
+                self.warning = f"WARNING: couldn't check method calls due to\n{error}"
+        return self._type_checker
+
+    def close(self) -> None:
+        """Stop the language server, if it was started."""
+        with self._lock:
+            if self._type_checker is not None:
+                self._type_checker.close()
+                self._type_checker = None
+
+    def __enter__(self) -> Checker:  # noqa: PYI034
+        """Return the checker, to close it at the end of a `with` statement."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop the language server."""
+        self.close()
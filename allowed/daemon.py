@@ -0,0 +1,238 @@
+"""Server that keeps configurations and a type checker loaded between checks.
+
+Running `allowed` once per file pays each time for starting Python,
+reading the configuration and starting the language server.
+`allowed serve` pays those costs once and then checks files on request,
+which suits autograders that check each submission separately.
+
+Clients connect to a Unix socket and send one JSON object per line:
+- `config`: the configuration's name, as for option `-c` (default: m269.json)
+- `unit`: check against units 1 to `unit`, or all units if 0 (default: 0)
+- `methods`: true to check method calls, as for option `-m` (default: false)
+- `path`: the absolute path of the file to check, or
+- `source` and `name`: the code or notebook to check and its file name.
+
+The server answers each request with one JSON object per line:
+`{"checked": bool, "errors": [[cell, line, message], ...]}`, as for `check_file`,
+with an additional `"warning"` if method calls couldn't be checked,
+or `{"error": message}` if the request is invalid.
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from pathlib import Path
+
+from allowed.allowed import (
+    check_file,
+    check_stream,
+    compile_units,
+    find_configuration,
+    get_constructs,
+    read_configuration,
+)
+from allowed.ls_client import LSClient, PyreflyServer
+
+
+def socket_path() -> Path:
+    """Return the default socket of the server, private to the current user."""
+    if runtime := os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(runtime) / "allowed.sock"
+    return Path(f"/tmp/allowed-{os.getuid()}.sock")  # noqa: S108
+
+
+class CheckServer(socketserver.ThreadingUnixStreamServer):
+    """Check files for clients, with state shared by all connections."""
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, verbose: bool) -> None:  # noqa: FBT001
+        """Listen on the socket at the given path, which only the user can use."""
+        # The socket is created private, so other users can't ever connect to it.
+        umask = os.umask(0o077)
+        try:
+            super().__init__(str(path), RequestHandler)
+        finally:
+            os.umask(umask)
+        self.verbose = verbose
+        # configuration file -> (modification time, unit tables, has methods)
+        self._configs: dict[Path, tuple[float, tuple, bool]] = {}
+        self._configs_lock = threading.Lock()
+        # The language server handles one document at a time.
+        self._type_checker: LSClient | None = None
+        self._type_checker_error = ""
+        self._type_checker_lock = threading.Lock()
+
+    def units(self, name: str) -> tuple[tuple, bool]:
+        """Return the unit tables of the named configuration and if it has methods.
+
+        Configurations are read once and again only if their file changes.
+        Raise ValueError if the configuration doesn't exist or is invalid.
+        """
+        if not name.endswith(".json"):
+            name += ".json"
+        if not (file := find_configuration(name)):
+            message = f"CONFIGURATION ERROR: {name} not found"
+            raise ValueError(message)
+        file = file.resolve()
+        modified = file.stat().st_mtime
+        with self._configs_lock:
+            if (config := self._configs.get(file)) and config[0] == modified:
+                return config[1], config[2]
+            language, imports, methods = read_configuration(file)
+            units = compile_units(language, imports, methods)
+            self._configs[file] = (modified, units, bool(methods))
+            if self.verbose:
+                print(f"INFO: using configuration {file}")
+        return units, bool(methods)
+
+    def type_checker(self) -> LSClient | None:
+        """Return the language server, starting it on first use.
+
+        Must be called with the type checker lock held.
+        """
+        if self._type_checker is None and not self._type_checker_error:
+            try:
+                self._type_checker = LSClient(PyreflyServer())
+            except (OSError, RuntimeError) as error:
+                self._type_checker_error = str(error)
+        return self._type_checker
+
+    def check(self, request: dict) -> dict:
+        """Return the response to a check request.
+
+        Raise TypeError if the request isn't a JSON object.
+        """
+        if not isinstance(request, dict):
+            raise TypeError
+        units, has_methods = self.units(request.get("config", "m269.json"))
+        unit = request.get("unit", 0)
+        if not isinstance(unit, int) or unit < 0:
+            message = "ERROR: unit must be positive"
+            raise ValueError(message)
+        constructs = get_constructs(unit, units)
+        if "path" in request:
+            filename = request["path"]
+            file = None
+        else:
+            filename = request["name"]
+            source = request["source"]
+            file = io.BytesIO(source.encode("utf-8", "surrogateescape"))
+        if not (request.get("methods") and has_methods):
+            checked, errors = self._check(filename, file, constructs, None)
+            return {"checked": checked, "errors": errors}
+        with self._type_checker_lock:
+            if type_checker := self.type_checker():
+                checked, errors = self._check(filename, file, constructs, type_checker)
+                return {"checked": checked, "errors": errors}
+        checked, errors = self._check(filename, file, constructs, None)
+        warning = "WARNING: couldn't check method calls due to\n"
+        return {
+            "checked": checked,
+            "errors": errors,
+            "warning": warning + self._type_checker_error,
+        }
+
+    @staticmethod
+    def _check(
+        filename: str,
+        file: io.BytesIO | None,
+        constructs: tuple,
+        type_checker: LSClient | None,
+    ) -> tuple[bool, list]:
+        """Check the file or, if `file` isn't None, its contents."""
+        if file is None:
+            return check_file(filename, constructs, type_checker)
+        return check_stream(filename, file, constructs, type_checker)
+
+    def server_close(self) -> None:
+        """Stop listening and stop the language server."""
+        super().server_close()
+        if self._type_checker is not None:
+            self._type_checker.close()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answer the requests of one client connection, one line each."""
+
+    server: CheckServer
+
+    def handle(self) -> None:
+        """Answer each request until the client closes the connection."""
+        for line in self.rfile:
+            try:
+                response = self.server.check(json.loads(line))
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                response = {"error": "ERROR: invalid request"}
+            except (OSError, ValueError) as error:
+                response = {"error": str(error)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+def request(message: dict, path: Path | None = None) -> dict:
+    """Send a request to the server listening on `path` and return the response.
+
+    Relative file paths in the request are made absolute first.
+    """
+    if "path" in message:
+        message = {**message, "path": str(Path(message["path"]).resolve())}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path or socket_path()))
+        client.sendall(json.dumps(message).encode() + b"\n")
+        with client.makefile("rb") as responses:
+            return json.loads(responses.readline())
+
+
+def serve(arguments: list[str]) -> None:
+    """Implement the `allowed serve` command."""
+    argparser = argparse.ArgumentParser(
+        prog="allowed serve",
+        description="Check files on request from clients connected to a Unix socket.",
+    )
+    argparser.add_argument(
+        "-s",
+        "--socket",
+        type=Path,
+        default=socket_path(),
+        help=f"listen on the socket at path SOCKET (default: {socket_path()})",
+    )
+    argparser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="show additional info as configurations are loaded",
+    )
+    args = argparser.parse_args(arguments)
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("ERROR: can't serve (Unix sockets needed)")
+        sys.exit(1)
+    # Remove the socket left by a server that didn't stop cleanly.
+    if args.socket.is_socket():
+        try:
+            request({}, args.socket)
+        except OSError:
+            args.socket.unlink()
+        else:
+            print(f"ERROR: a server is already listening on {args.socket}")
+            sys.exit(1)
+    try:
+        server = CheckServer(args.socket, args.verbose)
+    except OSError as error:
+        print(f"OS ERROR: {error.strerror}")
+        sys.exit(1)
+    if args.verbose:
+        print(f"INFO: listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        args.socket.unlink(missing_ok=True)
@@ -0,0 +1,271 @@
+"""Find the Python files and notebooks to check in a folder and its subfolders.
+
+Subfolders that don't hold code to check, like `.git`, `__pycache__`,
+notebook checkpoints and virtual environments, are skipped without being
+entered, as are those excluded by options `--exclude` and (with `--gitignore`)
+by `.gitignore` files. Glob patterns with a `/` are matched against the path
+relative to the checked folder, other patterns against the file or folder name.
+With option `--changed-since`, only files changed according to git are checked
+and subfolders without such files aren't entered.
+"""
+
+import os
+import re
+import subprocess  # nosec B404
+from collections.abc import Iterable, Iterator, Mapping
+from fnmatch import fnmatch
+from pathlib import Path
+
+CHECKED = (".py", ".ipynb")
+# folders that never have code to check
+PRUNED = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".ipynb_checkpoints",
+        "__pycache__",
+        "node_modules",
+        ".venv",
+        "venv",
+        ".tox",
+        ".nox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+    }
+)
+VENV_MARKER = "pyvenv.cfg"  # file at the top of every virtual environment
+GITIGNORE = ".gitignore"
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a .gitignore glob into a regular expression over `/` paths."""
+    regex = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            regex.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            regex.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", index + 2)) > 0:
+            chars = re.sub(r"([\\\[^])", r"\\\1", pattern[index + 1 : end])
+            regex.append("[^" + chars[1:] + "]" if chars[0] == "!" else f"[{chars}]")
+            index = end
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex.append(re.escape(pattern[index]))
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    return "".join(regex)
+
+
+class IgnoreRules:
+    """The patterns of a `.gitignore` file, for paths relative to its folder."""
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        """Parse the lines of the file, skipping blank lines and comments."""
+        self.rules: list[tuple[re.Pattern, bool, bool]] = []  # regex, !, folder/
+        for line in lines:
+            pattern = line.rstrip("\n")
+            if not pattern.endswith("\\ "):
+                pattern = pattern.rstrip(" ")
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated or pattern.startswith("\\"):
+                pattern = pattern[1:]
+            folder_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            # a pattern without `/` (except at the end) matches at any depth
+            prefix = "" if "/" in pattern else "(?:.*/)?"
+            regex = re.compile(prefix + glob_to_regex(pattern.lstrip("/")))
+            self.rules.append((regex, negated, folder_only))
+
+    def ignores(self, path: str, is_folder: bool) -> bool | None:  # noqa: FBT001
+        """Return if the last rule matching the path ignores it, or None if none do."""
+        ignored = None
+        for regex, negated, folder_only in self.rules:
+            if (is_folder or not folder_only) and regex.fullmatch(path):
+                ignored = not negated
+        return ignored
+
+
+def read_rules(folder: str) -> IgnoreRules | None:
+    """Return the rules of the folder's `.gitignore` file, or None if it has none."""
+    try:
+        with Path(folder, GITIGNORE).open(encoding="utf-8", errors="replace") as file:
+            return IgnoreRules(file)
+    except OSError:
+        return None
+
+
+def changed_files(folder: str, ref: str) -> frozenset[str]:
+    """Return the files in `folder` added or modified since git commit `ref`.
+
+    Files not committed yet, including new files not ignored by git, count as
+    changed. The paths are relative to `folder`, with `/` separators, and
+    the paths of the subfolders with changed files, ending in `/`, are included.
+    Raise ValueError if git can't compare the folder with the commit.
+    """
+    if ref.startswith("-"):
+        raise ValueError(f"{ref} isn't a git commit")  # noqa: EM102, TRY003
+    commands = (
+        [
+            *("diff", "--name-only", "--relative", "--no-renames", "--diff-filter=AM"),
+            *("-z", ref, "--", "."),
+        ],
+        ["ls-files", "--others", "--exclude-standard", "-z", "--", "."],
+    )
+    paths: set[str] = set()
+    for command in commands:
+        try:
+            output = subprocess.run(  # nosec B603
+                ["git", *command],  # noqa: S603, S607
+                cwd=folder,
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+        except FileNotFoundError as error:
+            raise ValueError("git not found") from error  # noqa: EM101, TRY003
+        except subprocess.CalledProcessError as error:
+            message = error.stderr.strip().splitlines() or ["unknown error"]
+            raise ValueError(f"git failed in {folder}: {message[0]}") from error  # noqa: EM102, TRY003
+        paths.update(path for path in output.split("\0") if path)
+    folders: set[str] = set()
+    for path in paths:
+        parts = path.split("/")[:-1]
+        folders.update("/".join(parts[:end]) + "/" for end in range(1, len(parts) + 1))
+    return frozenset(paths | folders)
+
+
+class FileFinder:
+    """Which files and subfolders of the checked folders to check."""
+
+    def __init__(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        gitignore: bool = False,  # noqa: FBT001, FBT002
+        changed: Mapping[str, frozenset[str]] | None = None,
+    ) -> None:
+        """Check the files matching some `include` pattern, if there are any.
+
+        Skip the files and subfolders matching some `exclude` pattern and,
+        if `gitignore` is true, those ignored by `.gitignore` files.
+        If `changed` is given, it maps each folder to check to its changed
+        files and subfolders, as returned by `changed_files`: skip all others.
+        """
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.gitignore = gitignore
+        self.changed = changed
+
+    def find(self, folder: str) -> Iterator[str]:
+        """Yield the Python files and notebooks in `folder` and subfolders, in order.
+
+        The files of each folder are yielded by name, before the files of its
+        subfolders, which are visited by name. Folders that can't be read
+        and symbolic links to folders are skipped.
+        """
+        # Each .gitignore applies to paths relative to its folder.
+        ignores = self._outer_rules(folder) if self.gitignore else []
+        changed = None if self.changed is None else self.changed.get(folder)
+        stack = [(folder, "", ignores)]  # folder, relative path, [(rules, path)]
+        while stack:
+            path, relative, ignores = stack.pop()
+            try:
+                with os.scandir(path) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            if self.gitignore and (rules := read_rules(path)):
+                ignores = [*ignores, (rules, "")]
+            subfolders = []
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    continue
+                entry_path = f"{relative}{name}/" if is_folder else relative + name
+                if changed is not None and entry_path not in changed:
+                    continue
+                if is_folder:
+                    if self._enters(entry, relative, ignores):
+                        inner = [
+                            (rules, f"{prefix}{name}/") for rules, prefix in ignores
+                        ]
+                        subfolders.append((entry.path, f"{relative}{name}/", inner))
+                elif name.endswith(CHECKED) and self._checks(name, relative, ignores):
+                    yield str(Path(entry.path))
+            stack.extend(reversed(subfolders))
+
+    def _enters(self, entry: os.DirEntry, relative: str, ignores: list) -> bool:
+        """Return True if the subfolder may have files to check."""
+        name = entry.name
+        return not (
+            entry.is_symlink()
+            or name in PRUNED
+            or Path(entry.path, VENV_MARKER).exists()
+            or matches(self.exclude, name, relative)
+            or is_ignored(ignores, name, is_folder=True)
+        )
+
+    def _checks(self, name: str, relative: str, ignores: list) -> bool:
+        """Return True if the Python file or notebook is to be checked."""
+        return not (
+            (self.include and not matches(self.include, name, relative))
+            or matches(self.exclude, name, relative)
+            or is_ignored(ignores, name, is_folder=False)
+        )
+
+    @staticmethod
+    def _outer_rules(folder: str) -> list[tuple[IgnoreRules, str]]:
+        """Return the rules of the `.gitignore` files in the folder's repository.
+
+        Only the files in the folders above `folder`, up to the top folder of
+        the git repository it is in, are read. If `folder` isn't in a
+        repository, there are no such rules.
+        """
+        path = Path(folder).resolve()
+        if (path / ".git").exists():
+            return []
+        ignores = []
+        for parent in path.parents:
+            if rules := read_rules(str(parent)):
+                ignores.append((rules, path.relative_to(parent).as_posix() + "/"))
+            if (parent / ".git").exists():
+                return ignores[::-1]
+        return []
+
+
+def matches(patterns: list[str], name: str, relative: str) -> bool:
+    """Return True if the file or folder in folder `relative` matches a pattern."""
+    return any(
+        fnmatch(relative + name if "/" in pattern else name, pattern)
+        for pattern in patterns
+    )
+
+
+def is_ignored(ignores: list, name: str, is_folder: bool) -> bool:  # noqa: FBT001
+    """Return True if the innermost `.gitignore` with a matching rule ignores it."""
+    ignored = False
+    for rules, prefix in ignores:
+        decision = rules.ignores(prefix + name, is_folder)
+        if decision is not None:
+            ignored = decision
+    return ignored
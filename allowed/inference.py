@@ -0,0 +1,288 @@
+"""Infer the types of method call receivers that are obvious from the code.
+
+With option -m, the type checker is asked for the type of each receiver,
+but many receivers don't need it: literals like `[]` and `"text"`,
+constructor calls like `list(...)` and `deque(...)`, and names assigned once,
+from one of those, in the scope where the method is called.
+The type checker is only asked about the other receivers.
+
+The inferred type is the one the type checker would give, i.e. the class that
+defines the method, so it's only used if the method is an instance method of
+that class.
+Names only bound by `import` are modules: calls on them aren't method calls.
+"""
+
+import ast
+import collections
+from collections.abc import Iterable, Mapping
+from types import ClassMethodDescriptorType
+from typing import Any, NamedTuple
+
+# the type names given by the type checker for the classes that can be inferred
+TYPES: dict[str, type] = {
+    "list": list,
+    "dict": dict,
+    "set": set,
+    "frozenset": frozenset,
+    "tuple": tuple,
+    "str": str,
+    "bytes": bytes,
+    "int": int,
+    "float": float,
+    "complex": complex,
+    "deque": collections.deque,
+}
+
+LITERALS: dict[type[ast.AST], str] = {
+    ast.List: "list",
+    ast.ListComp: "list",
+    ast.Dict: "dict",
+    ast.DictComp: "dict",
+    ast.Set: "set",
+    ast.SetComp: "set",
+    ast.Tuple: "tuple",
+    ast.JoinedStr: "str",
+}
+
+# the kinds of methods called on a class, not an instance
+NOT_INSTANCE_METHODS = (classmethod, staticmethod, ClassMethodDescriptorType)
+
+MODULE = "module"  # the inferred type of names bound by `import`
+
+# functions that can bind global names without assigning them
+DYNAMIC = {"exec", "globals", "locals", "vars", "setattr", "get_ipython"}
+
+# nodes whose body is a scope of its own
+SCOPES = (
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.Lambda,
+    ast.ClassDef,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+)
+
+
+def method_type(type_name: str | None, method: str) -> str | None:
+    """Return the type name if the type defines the instance method, otherwise None.
+
+    The type checker doesn't give the receiver type of class and static methods,
+    so neither is it inferred for them.
+    """
+    if type_name is None or type_name == MODULE:
+        return type_name
+    defined = vars(TYPES[type_name]).get(method)
+    if defined is None or isinstance(defined, NOT_INSTANCE_METHODS):
+        return None
+    return type_name
+
+
+class MethodIndex(NamedTuple):
+    """The method names whose calls may be violations of a METHODS table."""
+
+    allowed: frozenset[str]  # the methods allowed for all types in the table
+    defined: frozenset[str] | None  # those defined by the types, None if unknown
+
+    def may_violate(self, method: str) -> bool:
+        """Return False if a call of the method can't be a violation."""
+        return method not in self.allowed and (
+            self.defined is None or method in self.defined
+        )
+
+
+def index_methods(methods: Mapping[str, set[str]]) -> MethodIndex:
+    """Index the allowed methods of each type, given by the type checker's name.
+
+    If there are no types, no method call can be a violation.
+    """
+    if not methods:
+        return MethodIndex(frozenset(), frozenset())
+    allowed = frozenset.intersection(*(frozenset(names) for names in methods.values()))
+    if all(datatype in TYPES for datatype in methods):
+        defined = frozenset(
+            name for datatype in methods for name in vars(TYPES[datatype])
+        )
+        return MethodIndex(allowed, defined)
+    return MethodIndex(allowed, None)
+
+
+def value_type(node: ast.AST) -> str | None:
+    """Return the name of the value's type, if it's obvious, otherwise None."""
+    node_class = type(node)
+    if node_class is ast.Constant:
+        type_name = type(node.value).__name__  # type: ignore[attr-defined]
+        return type_name if type_name in TYPES else None
+    if node_class is ast.Call:
+        function = node.func  # type: ignore[attr-defined]
+        if isinstance(function, ast.Name):
+            name = function.id
+        elif (
+            isinstance(function, ast.Attribute)
+            and isinstance(function.value, ast.Name)
+            and function.value.id == "collections"
+        ):
+            name = function.attr
+        else:
+            return None
+        return name if name in TYPES else None
+    return LITERALS.get(node_class)
+
+
+def bound_name(node: ast.AST) -> str | None:
+    """Return the name bound by an argument, exception handler or match pattern."""
+    if isinstance(node, ast.arg):
+        return node.arg
+    if isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)):
+        return node.name
+    if isinstance(node, ast.MatchMapping):
+        return node.rest
+    return None
+
+
+class ModuleNames(NamedTuple):
+    """The names bound at the top level of a module or of a notebook cell."""
+
+    types: dict[str, str | None]  # name -> obvious type if assigned once, else None
+    unsafe: frozenset[str]  # names that may be rebound in other scopes
+    dynamic: bool  # if names may be bound in ways the code doesn't show
+
+    def type_of(self, name: str) -> str | None:
+        """Return the obvious type of the name, or None."""
+        if self.dynamic or name in self.unsafe:
+            return None
+        return self.types.get(name)
+
+
+def merge(modules: list[ModuleNames]) -> ModuleNames:
+    """Return the names bound by several cells of the same notebook."""
+    types: dict[str, str | None] = {}
+    for module in modules:
+        for name, type_name in module.types.items():
+            types[name] = None if name in types else type_name
+    unsafe = frozenset().union(*(module.unsafe for module in modules))
+    return ModuleNames(types, unsafe, any(module.dynamic for module in modules))
+
+
+class NameInference:
+    """Find the obvious types of some names used in a module."""
+
+    def __init__(self, receivers: dict[int, ast.Name]) -> None:
+        """Prepare to infer the types of the given receivers, indexed by call."""
+        self._calls = {id(name): call for call, name in receivers.items()}
+        self.types: dict[int, str | None] = {}  # call -> type, outside top level
+        self.top_level: list[tuple[int, str]] = []  # (call, name) at top level
+        self._unsafe: set[str] = set()
+        self._dynamic = False
+
+    def infer(self, tree: ast.AST) -> ModuleNames:
+        """Infer the types in all scopes. Return the top level names."""
+        types = self._scope(tree.body, self.top_level)  # type: ignore[attr-defined]
+        return ModuleNames(types, frozenset(self._unsafe), self._dynamic)
+
+    def _scope(self, nodes: list, receivers: list | None) -> dict[str, str | None]:
+        """Process the scope with the given nodes and return its names' types.
+
+        The receivers found in the scope are resolved if `receivers` is None,
+        otherwise they're added to it as (call, name) pairs.
+        """
+        bound: dict[str, str | None] = {}
+        found: list[tuple[int, str]] = []
+        nested: list[list] = []  # the nodes of each nested scope
+        stack = list(reversed(nodes))
+        while stack:
+            node = stack.pop()
+            node_class = type(node)
+            if node_class is ast.Name:
+                if type(node.ctx) is not ast.Load:
+                    self._bind(bound, node.id, None)
+                elif id(node) in self._calls:
+                    found.append((self._calls[id(node)], node.id))
+                elif node.id in DYNAMIC:
+                    self._dynamic = True
+            elif node_class in SCOPES:
+                stack.extend(self._enter(node, bound, nested))
+            else:
+                stack.extend(self._visit(node, bound))
+        for scope in nested:
+            self._scope(scope, None)
+        if receivers is None:
+            for call, name in found:
+                self.types[call] = None if name in self._unsafe else bound.get(name)
+        else:
+            receivers.extend(found)
+        return bound
+
+    def _visit(self, node: Any, bound: dict) -> Iterable[ast.AST]:
+        """Note the names the node binds and return its parts to visit."""
+        node_class = type(node)
+        if node_class in (ast.Assign, ast.AnnAssign):
+            targets = node.targets if node_class is ast.Assign else [node.target]
+            if (
+                len(targets) == 1
+                and type(targets[0]) is ast.Name
+                and node.value is not None
+            ):
+                self._bind(bound, targets[0].id, value_type(node.value))
+                if node_class is ast.AnnAssign:
+                    return (node.value, node.annotation)
+                return (node.value,)
+        elif node_class in (ast.Import, ast.ImportFrom):
+            self._import(node, bound)
+        elif node_class in (ast.Global, ast.Nonlocal):
+            self._unsafe.update(node.names)
+        elif node_class is ast.NamedExpr:
+            self._unsafe.add(node.target.id)
+        elif name := bound_name(node):
+            self._bind(bound, name, None)
+        return ast.iter_child_nodes(node)
+
+    def _import(self, node: ast.Import | ast.ImportFrom, bound: dict) -> None:
+        """Note the names bound by the import: only `import` binds modules."""
+        module = type(node) is ast.Import
+        for alias in node.names:
+            if alias.name == "*":
+                self._dynamic = True
+            name = alias.asname or alias.name.split(".")[0]
+            self._bind(bound, name, MODULE if module else None)
+
+    def _enter(self, node: ast.AST, bound: dict, nested: list) -> list[ast.AST]:
+        """Note the nested scope and return its parts evaluated in this scope."""
+        outer: list[ast.AST] = []
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            self._bind(bound, node.name, None)
+            outer.extend(node.decorator_list)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            arguments = node.args
+            outer.extend(arguments.defaults)
+            outer.extend(default for default in arguments.kw_defaults if default)
+            inner: list[ast.AST] = [
+                *arguments.posonlyargs,
+                *arguments.args,
+                *arguments.kwonlyargs,
+            ]
+            inner.extend(arg for arg in (arguments.vararg, arguments.kwarg) if arg)
+            if isinstance(node.body, list):
+                inner.extend(node.body)
+            else:
+                inner.append(node.body)
+            nested.append(inner)
+        elif isinstance(node, ast.ClassDef):
+            outer.extend(node.bases)
+            outer.extend(node.keywords)
+            nested.append(node.body)
+        else:  # a comprehension: the first iterable is evaluated outside
+            generators = node.generators  # type: ignore[attr-defined]
+            outer.append(generators[0].iter)
+            inner = [generators[0].target, *generators[0].ifs, *generators[1:]]
+            if isinstance(node, ast.DictComp):
+                inner.extend((node.key, node.value))
+            else:
+                inner.append(node.elt)  # type: ignore[attr-defined]
+            nested.append(inner)
+        return outer
+
+    def _bind(self, bound: dict, name: str, type_name: str | None) -> None:
+        """Note a binding of the name in a scope, with the type if obvious."""
+        bound[name] = None if name in bound else type_name
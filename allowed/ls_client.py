@@ -1,14 +1,23 @@
 """Minimal client for interacting with type checker language servers via LSP."""
 
+import contextlib
+import errno
 import json
 import os
+import queue
 import re
+import shutil
 import subprocess  # nosec B404
+import threading
+import time
+from collections.abc import Callable, Iterable
 from pathlib import Path
-from typing import Any, Protocol
+from typing import Any, Protocol, cast
 
 Location = tuple[int, int]  # (line_number, column_number)
 
+WINDOW = 64  # default maximum number of pipelined requests awaiting a response
+
 
 class LspStdioConnection:
     """Handle LSP message exchange with a language server process using stdio."""
@@ -19,7 +28,7 @@ class LspStdioConnection:
             command,  # noqa: S603
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             bufsize=0,
         )
         if not self._process.stdin or not self._process.stdout:
@@ -27,6 +36,8 @@ class LspStdioConnection:
         self._stdin = self._process.stdin
         self._stdout = self._process.stdout
         self._request_id = 0
+        self._ended = False  # whether the server's output or input was closed
+        self.latencies: list[float] = []  # seconds per request of the last batch
 
     def _read_message(self) -> dict[str, Any] | None:
         """Read a single LSP-framed JSON message from stdout.
@@ -35,11 +46,13 @@ class LspStdioConnection:
         """
         header = self._stdout.readline()
         if not header or not header.startswith(b"Content-Length: "):
+            self._ended = True
             return None
         content_length = int(header.split(b":", 1)[1].strip())
         self._stdout.readline()  # Skip blank line, as per LSP specification.
         body = self._stdout.read(content_length)
         if not body:
+            self._ended = True
             return None
         return json.loads(body.decode("utf-8"))
 
@@ -47,8 +60,12 @@ class LspStdioConnection:
         """Write a single LSP-framed JSON message to stdin."""
         data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
         header = f"Content-Length: {len(data)}\r\n\r\n".encode("ascii")
-        self._stdin.write(header + data)
-        self._stdin.flush()
+        try:
+            self._stdin.write(header + data)
+            self._stdin.flush()
+        except OSError:
+            self._ended = True
+            raise
 
     def request(self, method: str, params: dict[str, Any] | None = None) -> Any:
         """Send a JSON-RPC request and return its result."""
@@ -68,6 +85,66 @@ class LspStdioConnection:
                     raise RuntimeError(f"{method} error: {response['error']}")  # noqa: EM102, TRY003
                 return response.get("result")
 
+    def request_all(
+        self,
+        method: str,
+        params_list: list[dict[str, Any]],
+        window: int = WINDOW,
+        each: Callable[[int, Any], None] | None = None,
+    ) -> list[Any]:
+        """Send a JSON-RPC request per params and return the results in order.
+
+        Up to `window` requests are in flight at any time:
+        responses are matched to requests by their id, in whatever order they come.
+        If given, `each` is called with the index and result of each response
+        as it comes. If it raises an exception, the requests still pending
+        are cancelled. The time between sending each request and receiving
+        its response is stored in `latencies`.
+        """
+        results: list[Any] = [None] * len(params_list)
+        pending: dict[int, int] = {}  # request id -> index in params_list
+        sent_at: dict[int, float] = {}  # request id -> time sent
+        self.latencies = []
+        sent = 0
+        while sent < len(params_list) or pending:
+            while sent < len(params_list) and len(pending) < window:
+                self._request_id += 1
+                pending[self._request_id] = sent
+                sent_at[self._request_id] = time.perf_counter()
+                self._write_message(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": self._request_id,
+                        "method": method,
+                        "params": params_list[sent],
+                    }
+                )
+                sent += 1
+            response = self._read_message()
+            if response is None:
+                raise RuntimeError("LSP stream ended before a response was received.")  # noqa: EM101, TRY003
+            if (response_id := response.get("id")) in pending:
+                if "error" in response:
+                    raise RuntimeError(f"{method} error: {response['error']}")  # noqa: EM102, TRY003
+                index = pending.pop(response_id)
+                results[index] = response.get("result")
+                self.latencies.append(time.perf_counter() - sent_at.pop(response_id))
+                if each is not None:
+                    try:
+                        each(index, results[index])
+                    except Exception:
+                        self.cancel(pending)
+                        raise
+        return results
+
+    def cancel(self, request_ids: Iterable[int]) -> None:
+        """Ask the server not to answer the requests, if it's still running."""
+        try:
+            for request_id in request_ids:
+                self.notify("$/cancelRequest", {"id": request_id})
+        except OSError:
+            pass
+
     def notify(self, method: str, params: dict[str, Any] | None = None) -> None:
         """Send a JSON-RPC notification."""
         msg: dict[str, Any] = {"jsonrpc": "2.0", "method": method}
@@ -75,12 +152,25 @@ class LspStdioConnection:
             msg["params"] = params
         self._write_message(msg)
 
+    @property
+    def running(self) -> bool:
+        """Return whether the server is running.
+
+        A server whose output ended or that stopped reading its input
+        has stopped, even if its process hasn't exited yet.
+        """
+        return not self._ended and self._process.poll() is None
+
     def close(self) -> None:
-        """Shut down the language server cleanly."""
+        """Shut down the language server cleanly, or kill it if it doesn't stop."""
         try:
             self._process.terminate()
         finally:
-            self._process.wait(0.25)
+            try:
+                self._process.wait(0.25)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
 
 
 class LanguageServer(Protocol):
@@ -104,6 +194,20 @@ class LanguageServer(Protocol):
         ...
 
 
+def server_version(server: LanguageServer) -> str:
+    """Return the version reported by the server's command, or "" if unknown."""
+    try:
+        return subprocess.run(  # nosec B603
+            [server.command()[0], "--version"],  # noqa: S603
+            capture_output=True,
+            check=True,
+            text=True,
+            timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
 def _infer_literal(inner: str) -> str:
     """Infer base type from the inner value of a Literal[...] expression."""
     if re.match(r"^b(['\"].*['\"])$", inner):
@@ -249,48 +353,270 @@ class TyServer:
 
 
 class LSClient:
-    """Generic language server client."""
-
-    def __init__(self, source: str, server: LanguageServer) -> None:
-        """Perform the handshake, open the document."""
+    """Generic language server client.
+
+    A client is a session with one server process: documents are opened,
+    queried and closed one at a time, so the server is started only once.
+    The server is started, and each document is sent to it, only when
+    the first query is made, so that files without queries don't need it,
+    unless the server is started beforehand with `start`.
+    The session's workspace consists of the folders being checked,
+    so that the server analyses the imports they share only once.
+    If the server stops during a query, it's restarted and queried again.
+    """
+
+    def __init__(
+        self,
+        server: LanguageServer,
+        window: int = WINDOW,
+        folders: list[str] | None = None,
+    ) -> None:
+        """Prepare to start the server when needed.
+
+        `window` is the maximum number of queries sent before awaiting responses.
+        `folders` are the workspace folders, by default the current folder.
+        Raise FileNotFoundError if the server's command isn't installed.
+        """
         self._server = server
-        self._uri = "file://" + str(Path.cwd() / "__inmemory__.py")
-        self._connection = LspStdioConnection(self._server.command())
-        # Handshake
-        root_uri = Path.cwd().resolve().as_uri()
-        self._connection.request("initialize", server.initialise_params(root_uri))
-        self._connection.notify("initialized", {})
-        # Open document
-        self._connection.notify(
-            "textDocument/didOpen",
-            {
-                "textDocument": {
-                    "uri": self._uri,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": source,
-                }
-            },
-        )
+        self._window = window
+        self._folders = [Path(folder).resolve() for folder in folders or ["."]]
+        self._uri: str | None = None
+        self._source = ""  # of the open document
+        self._sent = False  # whether the open document was sent to the server
+        self._connection: LspStdioConnection | None = None
+        self._lock = threading.Lock()  # so that the server can start in a thread
+        self.latencies: list[float] = []  # seconds per query of last `receiver_types`
+        self.startups: list[float] = []  # seconds each start of the server took
+        command = server.command()[0]
+        if not shutil.which(command):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), command)
+
+    def start(self) -> None:
+        """Start the server, unless it's already running.
+
+        Raise OSError or RuntimeError if the server can't be started.
+        """
+        with self._lock:
+            if self._connection is not None:
+                return
+            start = time.perf_counter()
+            connection = LspStdioConnection(self._server.command())
+            params = self._server.initialise_params(self._folders[0].as_uri())
+            params["capabilities"]["workspace"] = {"workspaceFolders": True}
+            params["workspaceFolders"] = [
+                {"uri": folder.as_uri(), "name": folder.name}
+                for folder in self._folders
+            ]
+            try:
+                connection.request("initialize", params)
+                connection.notify("initialized", {})
+            except (OSError, RuntimeError):
+                connection.close()
+                raise
+            self._connection = connection
+            self.startups.append(time.perf_counter() - start)
+
+    def _connect(self) -> LspStdioConnection:
+        """Return the connection, after starting the server and sending the document."""
+        self.start()
+        connection = cast(LspStdioConnection, self._connection)
+        if self._uri is not None and not self._sent:
+            connection.notify(
+                "textDocument/didOpen",
+                {
+                    "textDocument": {
+                        "uri": self._uri,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": self._source,
+                    }
+                },
+            )
+            self._sent = True
+        return connection
+
+    def _restart(self) -> bool:
+        """Forget the server if it has stopped. Return whether it had stopped."""
+        if self._connection is None or self._connection.running:
+            return False
+        self._connection.close()
+        self._connection = None
+        self._sent = False
+        return True
+
+    def open_document(self, filename: str, source: str) -> None:
+        """Open the source of the given file, closing the previous document.
+
+        Notebooks are opened as a virtual Python file next to the notebook.
+        """
+        self.close_document()
+        path = Path(filename).resolve()
+        if path.suffix != ".py":
+            path = path.with_name(path.name + ".py")
+        self._uri = path.as_uri()
+        self._source = source
+
+    def close_document(self) -> None:
+        """Close the open document, if any."""
+        if self._connection is not None and self._sent:
+            try:
+                self._connection.notify(
+                    "textDocument/didClose", {"textDocument": {"uri": self._uri}}
+                )
+            except OSError:
+                self._restart()  # the server has stopped
+        self._uri = None
+        self._source = ""
+        self._sent = False
 
     def receiver_type(
         self, method_loc: Location | None, receiver_loc: Location | None
     ) -> str | None:
         """Return the receiver type given a method call expression, or None."""
-        if method_loc is None or receiver_loc is None:
+        if method_loc is None or receiver_loc is None or self._uri is None:
             return None
         line, column = self._server.choose_location(method_loc, receiver_loc)
         pos = {"line": line - 1, "character": column}  # 0-based location
-        result = self._connection.request(
+        result = self._connect().request(
             self._server.method(),
             {"textDocument": {"uri": self._uri}, "position": pos},
         )
         return self._server.parse_result(result)
 
-    def close(self) -> None:
-        """Shut down the language server cleanly."""
+    def receiver_types(
+        self,
+        locations: list[tuple[Location | None, Location | None]],
+        each: Callable[[int, str | None], None] | None = None,
+    ) -> list[str | None]:
+        """Return the receiver types of the given method calls, in order.
+
+        Each method call is given as a pair (method location, receiver location).
+        The queries are pipelined: they don't wait for each other's response.
+        If given, `each` is called with the index and type of each method call
+        as soon as its type is known. If it raises an exception,
+        the pending queries are cancelled and the exception is propagated.
+        If the server stops, it's restarted and asked the queries not yet
+        answered. Raise OSError or RuntimeError if the restarted server
+        stops too or if the server replies with an error.
+        """
+        types: list[str | None] = [None] * len(locations)
+        if self._uri is None:
+            self.latencies = []
+            return types
+        params: dict[int, dict] = {}  # index -> query parameters
+        for index, (method_loc, receiver_loc) in enumerate(locations):
+            if method_loc is not None and receiver_loc is not None:
+                line, column = self._server.choose_location(method_loc, receiver_loc)
+                pos = {"line": line - 1, "character": column}  # 0-based location
+                params[index] = {"textDocument": {"uri": self._uri}, "position": pos}
+        if not params:
+            self.latencies = []
+            return types
+
+        def answer(index: int, result: Any) -> None:
+            types[index] = self._server.parse_result(result)
+            del params[index]
+            if each is not None:
+                each(index, types[index])
+
+        try:
+            self._query(params, answer)
+        except (OSError, RuntimeError):
+            if not self._restart():
+                raise
+            try:
+                self._query(params, answer)  # the queries not yet answered
+            except (OSError, RuntimeError):
+                self._restart()  # so that the next document has a new server
+                raise
+        return types
+
+    def _query(
+        self, params: dict[int, dict], answer: Callable[[int, Any], None]
+    ) -> None:
+        """Send the queries and call `answer` with the index and result of each."""
+        indices = list(params)
+        connection = self._connect()
         try:
-            self._connection.request("shutdown")
-            self._connection.notify("exit", {})
+            connection.request_all(
+                self._server.method(),
+                list(params.values()),
+                self._window,
+                lambda position, result: answer(indices[position], result),
+            )
         finally:
-            self._connection.close()
+            self.latencies = connection.latencies
+
+    def close(self) -> None:
+        """Shut down the language server cleanly, if it's still running."""
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._connection.request("shutdown")
+                self._connection.notify("exit", {})
+            except (OSError, RuntimeError):
+                pass  # the server has already stopped, e.g. due to Ctrl-C
+            finally:
+                self._connection.close()
+                self._connection = None
+
+
+class SessionPool:
+    """Up to `size` sessions with servers, each used by one thread at a time.
+
+    The servers are started in the background: the first one when the pool
+    is created, the others when all sessions are in use and another is needed.
+    """
+
+    def __init__(
+        self, server: LanguageServer, size: int, folders: list[str] | None = None
+    ) -> None:
+        """Create the first session and start its server.
+
+        Raise FileNotFoundError if the server's command isn't installed.
+        """
+        self._server = server
+        self._size = size
+        self._folders = folders
+        self._sessions: list[LSClient] = []
+        self._free: queue.SimpleQueue[LSClient] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._free.put(self._add())
+
+    def _add(self) -> LSClient:
+        """Return a new session, whose server is being started in the background."""
+        session = LSClient(self._server, folders=self._folders)
+        self._sessions.append(session)
+        threading.Thread(target=_start, args=(session,), daemon=True).start()
+        return session
+
+    def acquire(self) -> LSClient:
+        """Return a free session, waiting for one if all are in use."""
+        with self._lock:
+            if self._free.empty() and len(self._sessions) < self._size:
+                return self._add()
+        return self._free.get()
+
+    def release(self, session: LSClient) -> None:
+        """Make the session available to other threads."""
+        self._free.put(session)
+
+    def take_startups(self) -> list[float]:
+        """Return the seconds each start of a server took, and forget them."""
+        startups = []
+        for session in self._sessions:
+            startups.extend(session.startups)
+            session.startups = []
+        return startups
+
+    def close(self) -> None:
+        """Shut down all servers."""
+        for session in self._sessions:
+            session.close()
+
+
+def _start(session: LSClient) -> None:
+    """Start the session's server, leaving any errors for its first query."""
+    with contextlib.suppress(OSError, RuntimeError):
+        session.start()
@@ -0,0 +1,100 @@
+"""Count the disallowed constructs used by each file, for option `--matrix`.
+
+The counts form a matrix with a row per file and a column per construct,
+saved as CSV or as a NumPy `.npz` archive with arrays `counts`, `files`
+and `constructs`. The `.npz` archive is written directly, without NumPy.
+"""
+
+import csv
+import sys
+import zipfile
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+from typing import IO
+
+FORMATS = (".csv", ".npz")
+COUNT = "I"  # the array type code of the counts: unsigned integers
+NPY_ALIGNMENT = 64  # bytes to which the header of an .npy array is padded
+
+
+class UsageMatrix:
+    """The number of times each file uses each construct not allowed.
+
+    Each file's counts are an array of integers, indexed by construct in the
+    order the constructs were first found, and only as long as needed to
+    include the file's constructs, so that files with few violations use
+    little memory.
+    """
+
+    def __init__(self) -> None:
+        """Start with no files and no constructs."""
+        self.files: list[str] = []
+        self.constructs: dict[str, int] = {}  # construct -> column
+        self._rows: list[array] = []
+
+    def add(self, filename: str, constructs: Iterable[str]) -> None:
+        """Add a row for the file, counting each occurrence of the constructs."""
+        row = array(COUNT)
+        for construct in constructs:
+            column = self.constructs.setdefault(construct, len(self.constructs))
+            if column >= len(row):
+                row.extend([0] * (column + 1 - len(row)))
+            row[column] += 1
+        self.files.append(filename)
+        self._rows.append(row)
+
+    def save(self, filename: str) -> None:
+        """Write the matrix in the format given by the file's extension.
+
+        Raise OSError if the file can't be written.
+        """
+        if filename.endswith(".csv"):
+            with Path(filename).open("w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file, lineterminator="\n")
+                writer.writerow(["file", *self.constructs])
+                padding = [0] * len(self.constructs)
+                for name, row in zip(self.files, self._rows, strict=True):
+                    writer.writerow([name, *row, *padding[len(row) :]])
+        else:
+            with zipfile.ZipFile(filename, "w") as archive:
+                with archive.open("counts.npy", "w", force_zip64=True) as file:
+                    self._write_counts(file)
+                with archive.open("files.npy", "w") as file:
+                    write_strings(file, self.files)
+                with archive.open("constructs.npy", "w") as file:
+                    write_strings(file, list(self.constructs))
+
+    def _write_counts(self, file: IO[bytes]) -> None:
+        """Write the counts as an .npy array, one row at a time."""
+        columns = len(self.constructs)
+        item_size = array(COUNT).itemsize
+        write_header(file, f"u{item_size}", (len(self.files), columns))
+        for row in self._rows:
+            file.write(row.tobytes())
+            file.write(bytes(item_size * (columns - len(row))))
+
+
+def write_header(file: IO[bytes], kind: str, shape: tuple[int, ...]) -> None:
+    """Write the header of an .npy array of the given kind and shape.
+
+    The kind is a NumPy type without byte order, e.g. `u4` or `U10`:
+    the byte order is the machine's.
+    """
+    order = "<" if sys.byteorder == "little" else ">"
+    header = (
+        f"{{'descr': '{order}{kind}', 'fortran_order': False, 'shape': {shape!r}, }}"
+    )
+    prefix = b"\x93NUMPY\x01\x00"  # magic string and version 1.0 of the format
+    length = len(prefix) + 2 + len(header) + 1  # header ends with a newline
+    header += " " * (-length % NPY_ALIGNMENT) + "\n"
+    file.write(prefix + len(header).to_bytes(2, "little") + header.encode("latin1"))
+
+
+def write_strings(file: IO[bytes], strings: list[str]) -> None:
+    """Write the strings as an .npy array of fixed-length Unicode strings."""
+    width = max((len(string) for string in strings), default=1) or 1
+    encoding = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+    write_header(file, f"U{width}", (len(strings),))
+    for string in strings:
+        file.write(string.ljust(width, "\0").encode(encoding))
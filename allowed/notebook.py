@@ -0,0 +1,204 @@
+"""Incremental reader of the code cells in Jupyter notebooks.
+
+Notebooks may have many megabytes of outputs (e.g. images in base64)
+that are irrelevant for checking the code. Instead of decoding the whole
+JSON document, the reader scans the file in chunks and only decodes the
+type and source of each cell, skipping all other values byte by byte.
+Skipped values are only checked for balanced brackets and quotes.
+"""
+
+import json
+import re
+from collections.abc import Iterator
+from typing import BinaryIO
+
+CHUNK_SIZE = 1 << 16  # bytes read from the file at a time
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+BRACKET = re.compile(rb'["\[\]{}]')  # a string or a bracket in a list or object
+SCALAR = re.compile(rb"[^,\]} \t\n\r]*")  # number, true, false or null
+
+
+class Scanner:
+    """Consume a JSON document from a binary file, one token at a time."""
+
+    def __init__(self, file: BinaryIO) -> None:
+        """Prepare to scan the file from its current position."""
+        self._file = file
+        self._buffer = b""
+        self._pos = 0  # position of the next unconsumed byte in the buffer
+        self._lines = 0  # number of lines in the bytes discarded from the buffer
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        """Return an exception for the current position, like `json.loads` does."""
+        line = self._lines + self._buffer.count(b"\n", 0, self._pos) + 1
+        error = json.JSONDecodeError(message, "", 0)
+        error.lineno = line
+        return error
+
+    def _fill(self) -> bool:
+        """Discard the consumed bytes and read more. Return False at end of file."""
+        self._lines += self._buffer.count(b"\n", 0, self._pos)
+        chunk = self._file.read(CHUNK_SIZE)
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return bool(chunk)
+
+    def peek(self) -> bytes:
+        """Skip whitespace and return the next byte, or b"" at end of file."""
+        while True:
+            match = WHITESPACE.match(self._buffer, self._pos)
+            self._pos = match.end() if match else self._pos
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos : self._pos + 1]
+            if not self._fill():
+                return b""
+
+    def expect(self, expected: bytes) -> None:
+        """Consume the expected byte, after any whitespace."""
+        if self.peek() != expected:
+            message = f"Expecting {expected.decode()!r}"
+            raise self.error(message)
+        self._pos += 1
+
+    def string(self, keep: bool) -> bytes:  # noqa: FBT001
+        """Consume a string. If `keep` is true, return it as JSON, else b""."""
+        self.expect(b'"')
+        parts = [b'"']
+        quote = -1  # position of the next quote in the buffer, or its length if none
+        while True:
+            buffer, start = self._buffer, self._pos
+            # bytes.find is much faster than a regular expression on long strings
+            if quote < start:
+                quote = buffer.find(b'"', start)
+                if quote < 0:
+                    quote = len(buffer)
+            escape = buffer.find(b"\\", start, quote)
+            if escape < 0:
+                end = min(quote + 1, len(buffer))
+            elif escape + 1 < len(buffer):
+                end = escape + 2  # skip the backslash and the escaped byte
+            else:
+                end = escape  # the escape sequence continues in the next chunk
+            if keep:
+                parts.append(buffer[start:end])
+            self._pos = end
+            if escape < 0 and quote < len(buffer):
+                return b"".join(parts) if keep else b""
+            if escape < 0 or end == escape:
+                if not self._fill():
+                    message = "Unterminated string"
+                    raise self.error(message)
+                quote = -1
+
+    def text(self) -> str:
+        """Consume a string and return its value."""
+        return json.loads(self.string(keep=True).decode("utf-8", "surrogateescape"))
+
+    def skip(self) -> None:
+        """Consume any value without decoding it."""
+        first = self.peek()
+        if first == b'"':
+            self.string(keep=False)
+        elif first in (b"[", b"{"):
+            self._pos += 1
+            depth = 1
+            while depth:
+                match = BRACKET.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    if not self._fill():
+                        message = "Unterminated list or object"
+                        raise self.error(message)
+                elif match.group() == b'"':
+                    self._pos = match.start()
+                    self.string(keep=False)
+                else:
+                    depth += 1 if match.group() in b"[{" else -1
+                    self._pos = match.end()
+        else:
+            if not first or first in b",]}":
+                message = "Expecting value"
+                raise self.error(message)
+            match = SCALAR.match(self._buffer, self._pos)
+            self._pos = match.end() if match else self._pos
+            # The scalar may continue in the next chunk.
+            while self._pos == len(self._buffer) and self._fill():
+                match = SCALAR.match(self._buffer)
+                self._pos = match.end() if match else self._pos
+
+    def items(self) -> Iterator[str]:
+        """Consume an object, yielding each key; the caller consumes the value."""
+        self.expect(b"{")
+        if self.peek() == b"}":
+            self._pos += 1
+            return
+        while True:
+            key = self.text()
+            self.expect(b":")
+            yield key
+            if self.peek() == b"}":
+                self._pos += 1
+                return
+            self.expect(b",")
+
+    def elements(self) -> Iterator[None]:
+        """Consume a list, yielding once per element; the caller consumes it."""
+        self.expect(b"[")
+        if self.peek() == b"]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            if self.peek() == b"]":
+                self._pos += 1
+                return
+            self.expect(b",")
+
+    def source(self) -> str:
+        """Consume a cell's source, a string or a list of strings."""
+        if self.peek() == b'"':
+            return self.text()
+        return "".join(self.text() for _ in self.elements())
+
+
+def code_cells(file: BinaryIO) -> Iterator[str]:
+    """Yield the source of each code cell in the notebook, in order.
+
+    Raise `json.JSONDecodeError` if the file isn't in notebook format.
+    """
+    scanner = Scanner(file)
+    found_cells = False
+    for key in scanner.items():
+        if key != "cells":
+            scanner.skip()
+            continue
+        found_cells = True
+        for _ in scanner.elements():
+            if (source := code_source(scanner)) is not None:
+                yield source
+    if scanner.peek():
+        message = "Extra data"
+        raise scanner.error(message)
+    if not found_cells:
+        message = "Notebook without cells"
+        raise scanner.error(message)
+
+
+def code_source(scanner: Scanner) -> str | None:
+    """Consume a cell. Return its source if it's a code cell, otherwise None."""
+    cell_type = source = None
+    for key in scanner.items():
+        if key == "cell_type":
+            cell_type = scanner.text()
+        elif key == "source" and cell_type in (None, "code"):
+            source = scanner.source()
+        else:
+            scanner.skip()
+    if cell_type is None:
+        message = "Cell without type"
+        raise scanner.error(message)
+    if cell_type == "code" and source is None:
+        message = "Code cell without source"
+        raise scanner.error(message)
+    return source if cell_type == "code" else None
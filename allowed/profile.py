@@ -0,0 +1,139 @@
+"""Wall time of each stage of checking each file, for option `--profile`.
+
+The stages are reading (decoding the file or the notebook's JSON),
+transforming notebook cells with IPython, parsing, walking the syntax tree
+and asking the language server the receiver types of method calls.
+Stages may be nested: the time of an inner stage isn't counted in the outer one.
+Files checked in parallel threads are timed separately, in wall time.
+"""
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TextIO
+
+STAGES = ("read", "transform", "parse", "walk", "hover")
+PERCENTILES = (50, 90, 99)
+SLOWEST = 10  # number of files listed in the summary
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """Return the value below which `percent` of the sorted values are."""
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+class CurrentFile(threading.local):
+    """The file whose stages each thread is timing."""
+
+    def __init__(self) -> None:
+        """Start with no file."""
+        self.filename = ""
+        self.stages: dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.nested: list[float] = []  # time of inner stages, per open stage
+
+
+class Profile:
+    """The times of the stages per file, of starting servers and of hover requests.
+
+    The times of a profile can be taken out and merged into another one,
+    so that worker processes can report their times to the main process.
+    """
+
+    def __init__(self) -> None:
+        """Start with no times recorded."""
+        self.files: dict[str, dict[str, float]] = {}  # file -> stage -> seconds
+        self.requests: dict[str, int] = {}  # file -> number of hover requests
+        self.latencies: list[float] = []  # seconds per hover request
+        self.startups: list[float] = []  # seconds per language server started
+        self._current = CurrentFile()
+
+    def start_file(self, filename: str) -> None:
+        """Record the following stages of this thread for the given file."""
+        current = self._current
+        current.filename = filename
+        current.stages = self.files.setdefault(filename, dict.fromkeys(STAGES, 0.0))
+        current.nested = []
+        self.requests.setdefault(filename, 0)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Add the time spent in the `with` block to the stage of the current file."""
+        current = self._current
+        start = time.perf_counter()
+        current.nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current.stages[name] += elapsed - current.nested.pop()
+            if current.nested:
+                current.nested[-1] += elapsed
+
+    def add_latencies(self, latencies: list[float]) -> None:
+        """Record the latencies of the current file's hover requests."""
+        filename = self._current.filename
+        self.latencies.extend(latencies)
+        self.requests[filename] = self.requests.get(filename, 0) + len(latencies)
+
+    def add_startups(self, startups: list[float]) -> None:
+        """Record how long servers took to start, in the background or not."""
+        self.startups.extend(startups)
+
+    def take(self) -> tuple:
+        """Return the times recorded so far and forget them."""
+        times = (self.files, self.requests, self.latencies, self.startups)
+        self.files, self.requests, self.latencies, self.startups = {}, {}, [], []
+        return times
+
+    def merge(self, times: tuple) -> None:
+        """Add the times taken from another profile."""
+        files, requests, latencies, startups = times
+        for filename, stages in files.items():
+            own = self.files.setdefault(filename, dict.fromkeys(STAGES, 0.0))
+            for name, seconds in stages.items():
+                own[name] += seconds
+        for filename, count in requests.items():
+            self.requests[filename] = self.requests.get(filename, 0) + count
+        self.latencies.extend(latencies)
+        self.startups.extend(startups)
+
+    def show(self, output: TextIO) -> None:
+        """Write the totals per stage and the slowest files, slowest first."""
+        if not self.files:
+            print("PROFILE: no files were checked (results may be cached)", file=output)
+            return
+        print(f"PROFILE: {len(self.files)} files checked", file=output)
+        print(f"{'stage':>10} {'total (s)':>10} {'max (s)':>10}", file=output)
+        totals = {
+            name: [stages[name] for stages in self.files.values()] for name in STAGES
+        }
+        for name in sorted(STAGES, key=lambda name: -sum(totals[name])):
+            total = sum(totals[name])
+            print(f"{name:>10} {total:10.3f} {max(totals[name]):10.3f}", file=output)
+        if self.startups:
+            print(
+                f"language server started {len(self.startups)} times",
+                f"in {sum(self.startups):.3f}s",
+                file=output,
+            )
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            values = ", ".join(
+                f"p{percent} {percentile(latencies, percent) * 1000:.1f}"
+                for percent in PERCENTILES
+            )
+            print(
+                f"{len(latencies)} hover requests, latency (ms): {values},",
+                f"max {latencies[-1] * 1000:.1f}",
+                file=output,
+            )
+        print("slowest files (s):", file=output)
+        files = sorted(self.files.items(), key=lambda item: -sum(item[1].values()))
+        for filename, stages in files[:SLOWEST]:
+            slowest = max(STAGES, key=lambda name: stages[name])
+            print(
+                f"{sum(stages.values()):10.3f} {filename}",
+                f"(mostly {slowest}, {self.requests.get(filename, 0)} hovers)",
+                file=output,
+            )
@@ -0,0 +1,157 @@
+"""Output formats for the violations found, written as each file is checked.
+
+Each file's violations are written at once, so that the report can be
+consumed while files are still being checked. The machine-readable formats
+write the information and warning messages to standard error instead.
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import TextIO
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_RULES = [
+    {
+        "id": "disallowed-construct",
+        "shortDescription": {"text": "Python construct not allowed"},
+    },
+    {
+        "id": "not-checked",
+        "shortDescription": {"text": "file or cell couldn't be checked"},
+    },
+]
+
+
+class Reporter:
+    """Report violations as lines `file:cell_N:line: message`."""
+
+    def __init__(self, output: TextIO, version: str) -> None:
+        """Write the report to `output` for the given version of `allowed`."""
+        self.output = output
+        self.log = output  # where information and warning messages go
+        self.version = version
+
+    def file(self, filename: str, errors: list) -> None:
+        """Report the (cell, line, message) triples of the file."""
+        lines = []
+        for cell, line, message in errors:
+            if cell:
+                lines.append(f"{filename}:cell_{cell}:{line}: {message}\n")
+            elif line is None:
+                lines.append(f"{filename}: {message}\n")
+            else:
+                lines.append(f"{filename}:{line}: {message}\n")
+        self.output.write("".join(lines))
+
+    def close(self, counters: dict[str, int]) -> None:
+        """Finish the report with the counters for all files checked."""
+
+
+class JsonlReporter(Reporter):
+    """Report one JSON object per line, with the counters as the last line.
+
+    Each violation is an object with keys `type`, `file`, `cell` (0 if not a
+    notebook), `line` (null if not about a line) and `message`.
+    The type is "violation", or "error" if the file or cell wasn't checked.
+    """
+
+    def __init__(self, output: TextIO, version: str) -> None:
+        """Write the report to `output` and the messages to standard error."""
+        super().__init__(output, version)
+        self.log = sys.stderr
+
+    def file(self, filename: str, errors: list) -> None:
+        """Report the (cell, line, message) triples of the file."""
+        records = []
+        for cell, line, message in errors:
+            record = {
+                "type": "error" if "ERROR" in message else "violation",
+                "file": filename,
+                "cell": cell,
+                "line": line,
+                "message": message,
+            }
+            records.append(json.dumps(record) + "\n")
+        if records:
+            self.output.write("".join(records))
+            self.output.flush()
+
+    def close(self, counters: dict[str, int]) -> None:
+        """Finish the report with an object of type "summary" and the counters."""
+        self.output.write(json.dumps({"type": "summary", **counters}) + "\n")
+        self.output.flush()
+
+
+class SarifReporter(Reporter):
+    """Report in the Static Analysis Results Interchange Format (SARIF 2.1.0).
+
+    The cell of a notebook violation is in the result's properties and
+    the line is relative to the cell. The counters are in the invocation's properties.
+    """
+
+    def __init__(self, output: TextIO, version: str) -> None:
+        """Write the report to `output` and the messages to standard error.
+
+        Nothing is written until the first file is reported or the report
+        is closed, so that no partial report is left if `allowed` exits early.
+        """
+        super().__init__(output, version)
+        self.log = sys.stderr
+        self._started = False
+        self._results = 0  # number of results written so far
+
+    def _start(self) -> None:
+        """Write the report up to the run's results array, if not done yet."""
+        if self._started:
+            return
+        self._started = True
+        tool = {
+            "driver": {
+                "name": "allowed",
+                "version": self.version,
+                "informationUri": "https://dsa-ou.github.io/allowed",
+                "rules": SARIF_RULES,
+            }
+        }
+        # Write the results as they come, inside the run's results array.
+        header = json.dumps(
+            {"$schema": SARIF_SCHEMA, "version": "2.1.0", "runs": [{"tool": tool}]}
+        )
+        self.output.write(header[: -len("}]}")] + ', "results": [')
+
+    def file(self, filename: str, errors: list) -> None:
+        """Report the (cell, line, message) triples of the file."""
+        self._start()
+        path = Path(filename)
+        uri = path.as_uri() if path.is_absolute() else path.as_posix()
+        results = []
+        for cell, line, message in errors:
+            location: dict = {"artifactLocation": {"uri": uri}}
+            if line is not None:
+                location["region"] = {"startLine": line}
+            rule = "not-checked" if "ERROR" in message else "disallowed-construct"
+            result: dict = {
+                "ruleId": rule,
+                "level": "error",
+                "message": {"text": message},
+                "locations": [{"physicalLocation": location}],
+            }
+            if cell:
+                result["properties"] = {"cell": cell}
+            separator = ",\n" if self._results else "\n"
+            results.append(separator + json.dumps(result))
+            self._results += 1
+        if results:
+            self.output.write("".join(results))
+            self.output.flush()
+
+    def close(self, counters: dict[str, int]) -> None:
+        """Finish the report with the invocation and its counters."""
+        self._start()
+        invocation = {"executionSuccessful": True, "properties": counters}
+        self.output.write(f'\n], "invocations": [{json.dumps(invocation)}]}}]}}\n')
+        self.output.flush()
+
+
+FORMATS = {"text": Reporter, "jsonl": JsonlReporter, "sarif": SarifReporter}
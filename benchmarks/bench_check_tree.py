@@ -0,0 +1,44 @@
+"""Measure how many AST nodes per second `check_tree` processes.
+
+The corpus consists of the `tests/sample_*.py` files, each repeated COPIES times.
+Run from the project's root directory with `python -m benchmarks.bench_check_tree`.
+"""
+
+import ast
+import sys
+import time
+from pathlib import Path
+
+from allowed import allowed
+
+COPIES = 200  # how often each sample file is repeated in the corpus
+ROUNDS = 5  # the best of these many rounds is reported
+
+
+def configure(config: str) -> tuple:
+    """Return the constructs allowed in all units of the given configuration."""
+    file = Path(allowed.__file__).parent / config
+    units = allowed.compile_units(*allowed.read_configuration(file))
+    return allowed.get_constructs(0, units)
+
+
+def main() -> None:
+    """Check the corpus against all units and print the throughput."""
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    constructs = configure("m269.json")
+    corpus = []
+    for sample in sorted(Path("tests").glob("sample_*.py")):
+        source = sample.read_text() * copies
+        corpus.append((ast.parse(source), source.splitlines()))
+    nodes = sum(1 for tree, _ in corpus for _ in ast.walk(tree))
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for tree, lines in corpus:
+            allowed.check_tree(tree, constructs, lines, [], [], None)
+        best = min(best, time.perf_counter() - start)
+    print(f"{nodes} nodes in {best:.3f}s: {nodes / best:,.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Generate corpora of Python files and notebooks to measure `allowed`.
+
+The corpus is built from `tests/sample.py` and `tests/sample.ipynb` and has:
+- `files/`: many copies of the sample Python file
+- `large.ipynb`: the sample notebook's code cells repeated, with large outputs
+- `nested.py`: deeply nested expressions
+- `methods.py`: many method calls, one per line, on function parameters,
+  so that the type checker is asked about each receiver.
+
+Run from the project's root directory with
+`python -m benchmarks.corpus FOLDER [--scale S]`, e.g. to time `allowed` on it.
+"""
+
+import argparse
+import base64
+import json
+import random
+from pathlib import Path
+
+SAMPLES = Path(__file__).parent.parent / "tests"
+
+FILES = 1000  # copies of the sample Python file, at scale 1
+CELLS = 1000  # code cells in the large notebook
+OUTPUT_SIZE = 10_000  # bytes of base64 image data in each cell output
+DEPTH = 150  # nesting of each expression, below the parser's limit of 200
+NESTED = 200  # lines with nested expressions
+CALLS = 2000  # lines with method calls
+CALLS_PER_FUNCTION = 20
+
+# parameters of various types and some of their methods, for methods.py
+# The types of parameters can't be inferred without the type checker.
+RECEIVERS = {
+    "s: str": ("s", ["upper", "lower", "strip", "split", "find"]),
+    "items: list[int]": ("items", ["append", "sort", "pop", "count", "copy"]),
+    "table: dict[str, int]": ("table", ["get", "keys", "items", "pop", "copy"]),
+    "seen: set[int]": ("seen", ["add", "discard", "union", "copy", "pop"]),
+}
+
+
+def write_files(folder: Path, copies: int) -> None:
+    """Write the copies of the sample Python file in `folder`."""
+    folder.mkdir(parents=True, exist_ok=True)
+    source = (SAMPLES / "sample.py").read_text()
+    for number in range(copies):
+        (folder / f"file_{number:05}.py").write_text(source)
+
+
+def write_notebook(file: Path, cells: int, output_size: int) -> None:
+    """Write a notebook with the sample's code cells repeated, with image outputs."""
+    notebook = json.loads((SAMPLES / "sample.ipynb").read_text())
+    code = [cell for cell in notebook["cells"] if cell["cell_type"] == "code"]
+    image = base64.b64encode(random.Random(0).randbytes(output_size * 3 // 4))
+    output = {
+        "data": {"image/png": image.decode(), "text/plain": ["<Figure>"]},
+        "metadata": {},
+        "output_type": "display_data",
+    }
+    notebook["cells"] = [
+        {**code[number % len(code)], "outputs": [output]} for number in range(cells)
+    ]
+    file.write_text(json.dumps(notebook, indent=1))
+
+
+def write_nested(file: Path, depth: int, lines: int) -> None:
+    """Write lines with expressions of the given nesting depth."""
+    expression = "x"
+    for level in range(depth):
+        expression = f"({expression} + {level})" if level % 2 else f"[{expression}]"
+    file.write_text("x = 1\n" + f"y = {expression}\n" * lines)
+
+
+def write_methods(file: Path, calls: int) -> None:
+    """Write the given number of method calls on parameters of various types."""
+    lines = []
+    receivers = list(RECEIVERS.values())
+    for number in range(calls):
+        if number % CALLS_PER_FUNCTION == 0:
+            parameters = ", ".join(RECEIVERS)
+            lines.append(f"def function_{number}({parameters}) -> None:")
+        name, methods = receivers[number % len(receivers)]
+        method = methods[number // len(receivers) % len(methods)]
+        lines.append(f"    {name}.{method}()")
+    file.write_text("\n".join(lines) + "\n")
+
+
+def generate(folder: Path, scale: float = 1) -> None:
+    """Write the corpus to `folder`, with the number of files, cells, etc. scaled."""
+    folder.mkdir(parents=True, exist_ok=True)
+    write_files(folder / "files", max(1, int(FILES * scale)))
+    write_notebook(folder / "large.ipynb", max(1, int(CELLS * scale)), OUTPUT_SIZE)
+    write_nested(folder / "nested.py", DEPTH, max(1, int(NESTED * scale)))
+    write_methods(folder / "methods.py", max(1, int(CALLS * scale)))
+
+
+def main() -> None:
+    """Implement the CLI."""
+    argparser = argparse.ArgumentParser(description="Generate a benchmark corpus.")
+    argparser.add_argument("folder", type=Path, help="folder to write the corpus to")
+    argparser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        help="multiply the number of files, cells and lines by SCALE (default: 1)",
+    )
+    args = argparser.parse_args()
+    generate(args.folder, args.scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Time each stage of checking a generated corpus and compare with a baseline.
+
+The stages are reading and checking notebooks, parsing Python files,
+checking syntax trees and querying the language server about method calls.
+Each stage is timed separately, as the best of several rounds.
+The start-up of the command line interface is timed too: importing `allowed`,
+as reported by `python -X importtime`, and checking one Python file.
+
+Run from the project's root directory with `python -m benchmarks.run`.
+Option `--save FILE` stores the times as a baseline and option `--compare FILE`
+exits with status 1 if any stage is slower than in the baseline by more than
+the threshold. Baselines are only comparable on the same machine:
+each records the machine it was measured on and, on another machine,
+the comparison isn't made and the exit status is 2.
+`benchmarks/baseline.json` is the reference baseline, at scale 1.
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from allowed import allowed
+from allowed.ls_client import LSClient, PyreflyServer
+from benchmarks.corpus import generate
+
+ROUNDS = 5  # the best of these many rounds is reported
+LSP_ROUNDS = 2  # rounds for the slower language server stage
+THRESHOLD = 0.25  # maximum slowdown allowed, as a fraction of the baseline time
+
+
+def best_time(stage: Callable[[], object], rounds: int) -> float:
+    """Return the shortest time, in seconds, the stage takes over several rounds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        stage()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_time() -> float:
+    """Return the seconds a new process takes to import the command line interface."""
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-c", "import allowed.allowed"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # the last line is for the module imported, with the time of its imports
+    return int(result.stderr.splitlines()[-1].split("|")[1]) / 1_000_000
+
+
+def run_cli(file: Path) -> None:
+    """Check the Python file with the command line interface, in a new process."""
+    subprocess.run(  # nosec B603
+        [sys.executable, "-m", "allowed.allowed", "--no-cache", str(file)],
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+
+
+def check_notebook(file: Path, constructs: tuple) -> None:
+    """Read and check the notebook like the command line interface, afresh."""
+    allowed.cell_memo.clear()  # otherwise later rounds reuse the cells' checks
+    with file.open("rb") as notebook:
+        allowed.check_stream(str(file), notebook, constructs, None)
+
+
+def measure(folder: Path) -> dict[str, float]:
+    """Return the time of each stage on the corpus in `folder`."""
+    file = Path(allowed.__file__).parent / "m269.json"
+    units = allowed.compile_units(*allowed.read_configuration(file))
+    constructs = allowed.get_constructs(0, units)
+    files = sorted((folder / "files").glob("*.py"))
+    files += [folder / "nested.py", folder / "methods.py"]
+    sources = [file.read_text() for file in files]
+    trees = [ast.parse(source) for source in sources]
+    lines = [source.splitlines() for source in sources]
+
+    def parse() -> None:
+        for source in sources:
+            ast.parse(source)
+
+    def check_trees() -> None:
+        for tree, source_lines in zip(trees, lines, strict=True):
+            allowed.check_tree(tree, constructs, source_lines, [], [], None)
+
+    times = {
+        "import": min(import_time() for _ in range(ROUNDS)),
+        "startup": best_time(lambda: run_cli(files[0]), ROUNDS),
+        "notebook": best_time(
+            lambda: check_notebook(folder / "large.ipynb", constructs), ROUNDS
+        ),
+        "ast.parse": best_time(parse, ROUNDS),
+        "check_tree": best_time(check_trees, ROUNDS),
+    }
+    try:
+        type_checker = LSClient(PyreflyServer())
+    except (OSError, RuntimeError) as error:
+        print(f"WARNING: skipped language server stage due to\n{error}")
+        return times
+    methods = folder / "methods.py"
+    source = methods.read_text()
+    tree = ast.parse(source)
+
+    def query() -> None:
+        type_checker.open_document(str(methods), source)
+        allowed.check_tree(tree, constructs, source.splitlines(), [], [], type_checker)
+        type_checker.close_document()
+
+    try:
+        times["lsp"] = best_time(query, LSP_ROUNDS)
+    finally:
+        type_checker.close()
+    return times
+
+
+def machine() -> dict[str, object]:
+    """Return a description of this machine, to check baselines are comparable."""
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def compare(
+    times: dict[str, float], baseline: dict[str, float], threshold: float
+) -> bool:
+    """Print the times against the baseline. Return False if any stage regressed."""
+    ok = True
+    for stage, seconds in times.items():
+        if stage not in baseline:
+            print(f"{stage:>14}: {seconds:8.3f}s (no baseline)")
+            continue
+        ratio = seconds / baseline[stage]
+        verdict = "SLOWER" if ratio > 1 + threshold else "ok"
+        print(f"{stage:>14}: {seconds:8.3f}s {ratio:6.2f}x baseline {verdict}")
+        ok = ok and verdict == "ok"
+    return ok
+
+
+def main() -> None:
+    """Implement the CLI."""
+    argparser = argparse.ArgumentParser(description="Time the stages of checking.")
+    argparser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        help="multiply the size of the corpus by SCALE (default: 1)",
+    )
+    argparser.add_argument("--save", type=Path, help="store the times in SAVE")
+    argparser.add_argument(
+        "--compare", type=Path, help="fail if slower than the times in COMPARE"
+    )
+    argparser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=f"slowdown that fails a comparison (default: {THRESHOLD})",
+    )
+    args = argparser.parse_args()
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["scale"] != args.scale:
+            print(f"ERROR: baseline has scale {baseline['scale']}, not {args.scale}")
+            sys.exit(1)
+        if baseline.get("machine") != machine():
+            print("ERROR: baseline was measured on another machine: not compared")
+            sys.exit(2)
+    with tempfile.TemporaryDirectory() as folder:
+        generate(Path(folder), args.scale)
+        times = measure(Path(folder))
+    if args.save:
+        results = {
+            "allowed": allowed.__version__,
+            "scale": args.scale,
+            "machine": machine(),
+            "times": times,
+        }
+        args.save.write_text(json.dumps(results, indent=2) + "\n")
+    if not args.compare:
+        for stage, seconds in times.items():
+            print(f"{stage:>14}: {seconds:8.3f}s")
+        return
+    if not compare(times, baseline["times"], args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+s = "abc"
+table = s.maketrans("a", "b")
+n = 5
+number = n.from_bytes(b"\x00")
+f = 1.5
+half = f.fromhex("0x1.8p0")
+d = {}
+keys = d.fromkeys("ab")
+
+
+def g(text: str, items: dict) -> None:
+    text.maketrans("a", "b")
+    items.fromkeys("ab")
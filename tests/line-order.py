@@ -0,0 +1,5 @@
+def f():
+    assert x
+
+
+assert y
@@ -0,0 +1,4 @@
+assert 1
+assert 2
+assert 3
+x = 1 if True else 2
@@ -1,7 +1,36 @@
 #!/bin/bash
 
 # this script is meant to be executed from the project's root directory
-cmd='python -m allowed.allowed'
+cmd='python -m allowed.allowed --no-cache'
+# a cache of its own, so that the user's cache is neither used nor changed
+export XDG_CACHE_HOME="$(mktemp -d)"
+trap 'rm -rf "$XDG_CACHE_HOME"' EXIT
+cached='python -m allowed.allowed'
+# use the Python API to check code, a notebook and a file
+api="from allowed.checker import Checker
+with Checker('m269', unit=5) as checker:
+    print(*checker.check_source('x = 1 if x else 2\\nassert x\\n'), sep='\\n')
+    with open('tests/sample.ipynb', 'rb') as notebook:
+        print(*checker.check_notebook(notebook.read()), sep='\\n')
+    print(*checker.check_path('tests/sample.py'), sep='\\n')"
+matrix="${TMPDIR:-/tmp}/allowed-matrix.csv"
+# start a server, send it a path and a source to check, and stop it
+socket="$XDG_CACHE_HOME/allowed.sock"
+requests="from pathlib import Path
+from allowed.daemon import request
+socket = Path('$socket')
+print('private:', socket.stat().st_mode & 0o077 == 0)
+print(request({'path': 'tests/sample.py', 'unit': 5}, socket))
+print(request({'name': 'x.py', 'source': 'x = 1 if x else 2\\nassert x\\n'}, socket))"
+serve() {
+    python -m allowed.allowed serve -s "$socket" > /dev/null &
+    server=$!
+    for _ in $(seq 50); do [ -S "$socket" ] && break; sleep 0.1; done
+    python -c "$requests"
+    kill $server
+    wait $server 2> /dev/null
+    rm -f "$socket"
+}
 if [ $# -eq 0 ]; then
     echo "Usage: ./tests.sh [run|create]"
 elif [ $1 = "run" ]; then
@@ -35,9 +64,47 @@ elif [ $1 = "run" ]; then
     $cmd tests/sample.ipynb | diff -w - tests/sample-nb.txt
     echo; echo "sample.ipynb -m"; echo "---"
     $cmd tests/sample.ipynb -m | diff -w - tests/sample-nb-m.txt
+    # class and static methods of obvious receivers aren't checked, like others
+    echo; echo "-m -u 8 class-methods.py"; echo "---"
+    $cmd -m -u 8 tests/class-methods.py | diff -w - tests/class-methods-m.txt
+    # machine-readable reports, with messages on stderr and counters at the end
+    echo; echo "-v --format jsonl sample.ipynb invalid.py"; echo "---"
+    $cmd -v --format jsonl tests/sample.ipynb tests/invalid.py 2>/dev/null | diff -w - tests/sample-jsonl.txt
+    echo; echo "--format sarif sample.py"; echo "---"
+    $cmd --format sarif tests/sample.py 2>/dev/null | diff -w - tests/sample-sarif.txt
+    # check the members of an archive, without extracting them
+    echo; echo "sample.zip"; echo "---"
+    $cmd tests/sample.zip | diff -w - tests/sample-zip.txt
+    # stop checking each file at its first violation
+    echo; echo "--fail-fast sample.py sample.ipynb"; echo "---"
+    $cmd --fail-fast tests/sample.py tests/sample.ipynb | diff -w - tests/sample-fail-fast.txt
+    # -f counts each construct once towards the maximum
+    echo; echo "-f --max-issues 3 repeated.py"; echo "---"
+    $cmd -f --max-issues 3 tests/repeated.py | diff -w - tests/repeated-first-max.txt
+    # the first issues are those of the whole report, in line order
+    echo; echo "-u 2 --max-issues 1 line-order.py"; echo "---"
+    $cmd -u 2 --max-issues 1 tests/line-order.py | diff -w - tests/line-order-max.txt
+    # the second run uses the results of the first
+    echo; echo "cached sample.py sample.ipynb, twice"; echo "---"
+    $cached tests/sample.py tests/sample.ipynb | diff -w - tests/sample-cached.txt
+    $cached tests/sample.py tests/sample.ipynb | diff -w - tests/sample-cached.txt
+    echo; echo "serve"; echo "---"
+    serve | diff -w - tests/serve.txt
+    echo; echo "Checker API"; echo "---"
+    python -c "$api" | diff -w - tests/checker-api.txt
+    # count the constructs used per file
+    echo; echo "--matrix sample.csv sample.py sample.ipynb"; echo "---"
+    $cmd --matrix "$matrix" tests/sample.py tests/sample.ipynb > /dev/null
+    diff -w "$matrix" tests/sample-matrix.csv
     # check folder, -f, regex and empty file allowed/__init__.py; sample_DD.py = sample.py
     echo; echo "-vf --file-unit '(\d+)' tests/ allowed/"; echo "---"
     $cmd -vf --file-unit '(\d+)' tests allowed | diff -w - tests/folder-first.txt
+    # only check some files in a folder
+    echo; echo "-f --include 'sample*' --exclude 'sample_*' tests/"; echo "---"
+    $cmd -f --include 'sample*' --exclude 'sample_*' tests | diff -w - tests/folder-globs.txt
+    # parallel checking must produce the same output in the same order
+    echo; echo "-j 2 -vf --file-unit '(\d+)' tests/ allowed/"; echo "---"
+    $cmd -j 2 -vf --file-unit '(\d+)' tests allowed | diff -w - tests/folder-first.txt
 elif [ $1 = "create" ]; then
     $cmd foobar -fm > tests/foobar-fm.txt
     $cmd foobar -hfm > tests/foobar-hfm.txt
@@ -50,7 +117,19 @@ elif [ $1 = "create" ]; then
     $cmd -c tm112 tests/sample.py > tests/sample-py-tm112.txt
     $cmd tests/sample.ipynb > tests/sample-nb.txt
     $cmd tests/sample.ipynb -m > tests/sample-nb-m.txt
+    $cmd -m -u 8 tests/class-methods.py > tests/class-methods-m.txt
+    $cmd -v --format jsonl tests/sample.ipynb tests/invalid.py 2>/dev/null > tests/sample-jsonl.txt
+    $cmd --format sarif tests/sample.py 2>/dev/null > tests/sample-sarif.txt
+    $cmd tests/sample.zip > tests/sample-zip.txt
+    $cmd --fail-fast tests/sample.py tests/sample.ipynb > tests/sample-fail-fast.txt
+    $cmd -f --max-issues 3 tests/repeated.py > tests/repeated-first-max.txt
+    $cmd -u 2 --max-issues 1 tests/line-order.py > tests/line-order-max.txt
+    $cached tests/sample.py tests/sample.ipynb > tests/sample-cached.txt
+    serve > tests/serve.txt
+    python -c "$api" > tests/checker-api.txt
+    $cmd --matrix tests/sample-matrix.csv tests/sample.py tests/sample.ipynb > /dev/null
     $cmd -vf --file-unit '(\d+)' tests allowed > tests/folder-first.txt
+    $cmd -f --include 'sample*' --exclude 'sample_*' tests > tests/folder-globs.txt
 else
     echo "Usage: ./tests.sh [run|create]"
 fi